@@ -0,0 +1,260 @@
+import argparse
+import json
+import math
+import platform
+import random
+import resource
+import sys
+import time
+
+import numpy as np
+
+from linalgebra import *
+from planner import Planner, Scene
+from rrt import RRT
+
+# Benchmarks for the planner and collision hot paths, on seeded random scenarios.
+# Run as: python benchmark.py --output results.json [--compare old_results.json]
+
+# how long each rate is measured for, in seconds
+min_time = 0.5
+
+# returns a seeded random scenario as (obstacles, base, goal)
+# the obstacles are polygons of the given number of vertices, moving and spinning at random,
+# spread so they cross the canvas within about horizon seconds
+def make_scenario(seed, obstacle_count, vertex_count, horizon, width=400, height=400):
+	rand = random.Random(seed)
+
+	obstacles = []
+	for i in range(obstacle_count):
+		radius = rand.uniform(10, 40)
+		points = []
+		for j in range(vertex_count):
+			a = 2 * math.pi * j / vertex_count
+			r = radius * rand.uniform(0.7, 1.0)
+			points.append(Vector2(r * math.cos(a), r * math.sin(a)))
+
+		speed = max(width, height) / float(horizon)
+		t0 = Vector3(rand.uniform(0, width), rand.uniform(0, height), rand.uniform(0, 2 * math.pi))
+		velocity = Vector3(rand.uniform(-speed, speed), rand.uniform(-speed, speed), rand.uniform(-1, 1))
+		obstacles.append(Shape(tuple(points), t0, velocity))
+
+	base = Vector2(rand.uniform(0, width / 4.0), rand.uniform(0, height / 4.0))
+	goal = Vector2(rand.uniform(width * 3 / 4.0, width), rand.uniform(height * 3 / 4.0, height))
+	return tuple(obstacles), base, goal
+
+# returns an RRT over the scenario grown to node_count nodes at random, all at time t
+def make_tree(scenario, node_count, seed, t=0):
+	obstacles, base, goal = scenario
+	rand = random.Random(seed)
+
+	rrt = RRT(None)
+	rrt.base = base
+	rrt.goal = goal
+	rrt.sim = Scene(obstacles)
+	rrt.first_node = rrt.add_node(base, 0)
+
+	nodes = [rrt.first_node]
+	while len(nodes) < node_count:
+		nodes.append(grow_random(rrt, nodes, rand, t))
+	return rrt, nodes
+
+# grows a branch of random length and direction off a random node, returns the new node's row
+def grow_random(rrt, nodes, rand, t):
+	trunk = rand.choice(nodes)
+	trunk_x, trunk_y = rrt.store.loc(trunk)
+	a = rand.uniform(0, 2 * math.pi)
+	dist = rand.uniform(RRT.branch_len_min, RRT.branch_len_max)
+	x = min(max(trunk_x + math.cos(a) * dist, 1), rrt.width - 1)
+	y = min(max(trunk_y + math.sin(a) * dist, 1), rrt.height - 1)
+	rrt.grow(trunk, Vector2(x, y), t)
+	return rrt.last_node
+
+# calls fn over and over for at least min_time seconds, returns how many calls it managed per second
+# if given, reset is called after each call to undo it, and isn't counted in the time
+def rate(fn, reset=None):
+	calls = 0
+	start = time.time()
+	if reset is None:
+		while True:
+			fn()
+			calls += 1
+			elapsed = time.time() - start
+			if elapsed >= min_time:
+				return calls / elapsed
+
+	elapsed = 0
+	while elapsed < min_time:
+		start = time.time()
+		fn()
+		elapsed += time.time() - start
+		calls += 1
+		reset()
+	return calls / elapsed
+
+# the benchmarks, each returning a list of (name, value, unit)
+
+def bench_branches(scenario, tree_size, seed):
+	rrt, nodes = make_tree(scenario, tree_size, seed)
+	rand = random.Random(seed + 1)
+	# add_branch draws from the global generators
+	random.seed(seed)
+	np.random.seed(seed)
+
+	# each new branch is pruned off again, so every one is grown on a tree of tree_size nodes
+	def prune():
+		rrt.remove_subtree(rrt.last_node)
+
+	return [('add_branch', rate(lambda: rrt.add_branch(rand.choice(nodes), 0), prune), 'branches/s')]
+
+def bench_lengths(scenario, tree_size, seed):
+	rrt, nodes = make_tree(scenario, tree_size, seed)
+
+	# create_lengths only sets lengths which are still 0, so clear them each time
+	def lengths():
+		rrt.store.len[nodes[1:]] = 0
+		rrt.create_lengths(rrt.first_node, 0, [])
+
+	return [('create_lengths', rate(lengths), 'passes/s')]
+
+def bench_validity(scenario, tree_size, seed, horizon):
+	rrt, nodes = make_tree(scenario, tree_size, seed)
+	times = iter(np.linspace(0, horizon, 1000000))
+
+	results = []
+	for vectorized in (False, True):
+		RRT.vectorized_collisions = vectorized
+		try:
+			passes = rate(lambda: rrt.validity(rrt.first_node, next(times)))
+		finally:
+			RRT.vectorized_collisions = True
+		results.append(('validity' if vectorized else 'validity_scalar', passes, 'passes/s'))
+
+	t = horizon / 2.0
+	starts, ends = rrt.store.segments(nodes[1:])
+	rrt.advance_validity(0)
+	moves = iter(np.linspace(0, horizon, 1000000))
+	results.append(('advance_validity', rate(lambda: rrt.advance_validity(next(moves))), 'passes/s'))
+
+	obstacles = scenario[0]
+	pairs = len(starts) * len(obstacles)
+	results.append(('collision_kernel', rate(lambda: rrt.segments_hit(starts, ends, t)) * pairs, 'tests/s'))
+	return results
+
+def bench_collisions(scenario, seed, horizon):
+	obstacles = scenario[0]
+	rrt = RRT(None)
+	rrt.sim = Scene(obstacles)
+	rand = random.Random(seed)
+
+	segments = [(Vector2(rand.uniform(0, 400), rand.uniform(0, 400)),
+		Vector2(rand.uniform(0, 400), rand.uniform(0, 400))) for i in range(64)]
+	state = {'i': 0}
+
+	def intersects_ob():
+		i = state['i'] = state['i'] + 1
+		start, end = segments[i % len(segments)]
+		rrt.intersects_ob(start, end, obstacles[i % len(obstacles)], horizon / 2.0)
+
+	times = iter(np.linspace(0, horizon, 1000000))
+	obstacle = obstacles[0]
+
+	return [
+		('intersects_ob', rate(intersects_ob), 'tests/s'),
+		('absolute_pos', rate(lambda: obstacle.absolute_pos(next(times))), 'poses/s'),
+		('trajectory', rate(lambda: obstacle.trajectory(np.linspace(0, horizon, 100))) * 100, 'poses/s'),
+		]
+
+def bench_first_path(scenario, seeds, horizon):
+	obstacles, base, goal = scenario
+	times = []
+	steps = []
+	found = 0
+	for seed in seeds:
+		result = Planner(obstacles, base, goal, horizon, seed=seed).plan()
+		if result.found():
+			found += 1
+			times.append(result.elapsed)
+			steps.append(result.steps)
+
+	results = [('paths_found', found / float(len(seeds)), 'fraction')]
+	if times:
+		results.append(('time_to_first_path', float(np.median(times)), 's'))
+		results.append(('steps_to_first_path', float(np.median(steps)), 'steps'))
+	return results
+
+# returns the most memory this process has used so far, in bytes
+def peak_memory():
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# linux gives kilobytes, mac gives bytes
+	return peak if sys.platform == 'darwin' else peak * 1024
+
+def run(args):
+	results = []
+
+	def record(params, measured):
+		for name, value, unit in measured:
+			results.append({'name': name, 'params': params, 'value': value, 'unit': unit})
+			sys.stdout.write('%-22s %-55s %14.2f %s\n' % (name, json.dumps(params, sort_keys=True), value, unit))
+
+	for obstacle_count in args.obstacles:
+		for vertex_count in args.vertices:
+			scenario = make_scenario(args.seed, obstacle_count, vertex_count, args.horizon)
+			params = {'obstacles': obstacle_count, 'vertices': vertex_count, 'horizon': args.horizon}
+			record(params, bench_collisions(scenario, args.seed, args.horizon))
+
+			for tree_size in args.tree_sizes:
+				tree_params = dict(params, tree_size=tree_size)
+				record(tree_params, bench_branches(scenario, tree_size, args.seed))
+				record(tree_params, bench_lengths(scenario, tree_size, args.seed))
+				record(tree_params, bench_validity(scenario, tree_size, args.seed, args.horizon))
+
+			seeds = range(args.seed, args.seed + args.runs)
+			record(params, bench_first_path(scenario, seeds, args.horizon))
+
+	record({}, [('peak_memory', peak_memory(), 'bytes')])
+	return results
+
+# prints how each result compares with the same benchmark in an earlier results file
+def compare(results, old_results):
+	old = {}
+	for result in old_results:
+		old[(result['name'], json.dumps(result['params'], sort_keys=True))] = result['value']
+
+	sys.stdout.write('\n%-22s %-55s %14s %14s %8s\n' % ('benchmark', 'params', 'before', 'after', 'ratio'))
+	for result in results:
+		key = (result['name'], json.dumps(result['params'], sort_keys=True))
+		if key in old:
+			ratio = '%8.2f' % (result['value'] / old[key]) if old[key] else '%8s' % '-'
+			sys.stdout.write('%-22s %-55s %14.2f %14.2f %s\n' % (key[0], key[1], old[key], result['value'], ratio))
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmarks the planner and collision checks.')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--obstacles', type=int, nargs='+', default=[3, 30])
+	parser.add_argument('--vertices', type=int, nargs='+', default=[4, 12])
+	parser.add_argument('--tree-sizes', type=int, nargs='+', default=[100, 1000])
+	parser.add_argument('--horizon', type=float, default=30)
+	parser.add_argument('--runs', type=int, default=5, help='planning runs for time to first path')
+	parser.add_argument('--output', help='file to save the results to, as JSON')
+	parser.add_argument('--compare', help='earlier results file to compare against')
+	args = parser.parse_args()
+
+	results = run(args)
+
+	if args.output:
+		with open(args.output, 'w') as output:
+			json.dump({
+				'python': platform.python_version(),
+				'numpy': np.__version__,
+				'time': time.time(),
+				'args': vars(args),
+				'results': results,
+				}, output, indent=1, sort_keys=True)
+
+	if args.compare:
+		with open(args.compare) as old:
+			compare(results, json.load(old)['results'])
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,213 @@
+import math
+
+import numpy as np
+
+# Collision checks between many segments and the sides of many obstacles at once, using NumPy.
+# These give the same answers as RRT.intersects_ob, see the Collisions section of the README.
+
+# the most (segment, side) pairs compared in one go, which bounds the memory used
+chunk_size = 1 << 20
+
+# returns True where c is clockwise of the segment a -> b, the same as rrt.rotates
+# a, b and c are arrays whose last axis is (x, y), and are broadcast against each other
+def orientation(a, b, c):
+	return ((b[..., 1] - a[..., 1]) * (c[..., 0] - b[..., 0]) -
+		(b[..., 0] - a[..., 0]) * (c[..., 1] - b[..., 1])) > 0
+
+# returns an (n, m) array which is True where segment i crosses side j
+# starts and ends are (n, 2) arrays of segments, side_starts and side_ends are (m, 2) arrays of sides
+def crosses(starts, ends, side_starts, side_ends):
+	starts = starts[:, np.newaxis, :]
+	ends = ends[:, np.newaxis, :]
+	side_starts = side_starts[np.newaxis, :, :]
+	side_ends = side_ends[np.newaxis, :, :]
+
+	side_1 = orientation(side_starts, side_ends, starts)
+	side_2 = orientation(side_starts, side_ends, ends)
+
+	connect_1 = orientation(starts, ends, side_starts)
+	connect_2 = orientation(starts, ends, side_ends)
+
+	# if both sets go different directions, then the side crosses the segment
+	return (side_1 != side_2) & (connect_1 != connect_2)
+
+# returns an (n,) array which is True where segment i crosses side i, for n segments and n sides
+def crosses_each(starts, ends, side_starts, side_ends):
+	side_1 = orientation(side_starts, side_ends, starts)
+	side_2 = orientation(side_starts, side_ends, ends)
+
+	connect_1 = orientation(starts, ends, side_starts)
+	connect_2 = orientation(starts, ends, side_ends)
+
+	return (side_1 != side_2) & (connect_1 != connect_2)
+
+# returns the sides of the polygons as (side_starts, side_ends, owners), where owners gives
+# the index of the polygon each side belongs to
+# polygons is a sequence of (k, 2) vertex arrays, the last vertex loops back to the first
+def polygon_sides(polygons):
+	if not len(polygons):
+		empty = np.zeros((0, 2))
+		return empty, empty, np.zeros(0, dtype=int)
+
+	side_starts = np.concatenate(polygons)
+	side_ends = np.concatenate([np.roll(vertices, -1, axis=0) for vertices in polygons])
+	owners = np.repeat(np.arange(len(polygons)), [len(vertices) for vertices in polygons])
+	return side_starts, side_ends, owners
+
+# returns the (k, 2) array of an obstacle's vertices at time t
+def obstacle_vertices(obstacle, t):
+	return np.array([(point[0], point[1]) for point in obstacle.absolute_pos(t).points], dtype=float)
+
+# returns the sides of all the obstacles at time t, see polygon_sides
+def obstacle_sides(obstacles, t):
+	return polygon_sides([obstacle_vertices(obstacle, t) for obstacle in obstacles])
+
+# returns an (n,) array which is True where a segment crosses any of the sides
+def segments_hit(starts, ends, side_starts, side_ends):
+	hit = np.zeros(len(starts), dtype=bool)
+	if not len(side_starts):
+		return hit
+
+	step = max(1, chunk_size // len(side_starts))
+	for i in range(0, len(starts), step):
+		hit[i:i + step] = crosses(starts[i:i + step], ends[i:i + step], side_starts, side_ends).any(axis=1)
+	return hit
+
+# returns an (n,) array which is True where segment i crosses polygon polygons[i], for segments each paired
+# with one polygon, where polygon j's sides are side_starts[firsts[j]:firsts[j + 1]] (and side_ends)
+def pairs_hit(starts, ends, polygons, firsts, side_starts, side_ends):
+	hit = np.zeros(len(starts), dtype=bool)
+	counts = firsts[polygons + 1] - firsts[polygons]
+	sides_to = np.cumsum(counts) # how many sides there are up to the end of each pair
+
+	# a chunk at a time, of about chunk_size sides
+	done = 0
+	while done < len(starts):
+		last = max(np.searchsorted(sides_to, sides_to[done] - counts[done] + chunk_size, 'right'), done + 1)
+		chunk_counts = counts[done:last]
+		pairs = np.repeat(np.arange(done, last), chunk_counts)
+		sides = (np.repeat(firsts[polygons[done:last]] - (np.cumsum(chunk_counts) - chunk_counts), chunk_counts)
+			+ np.arange(chunk_counts.sum()))
+		crossed = crosses_each(starts[pairs], ends[pairs], side_starts[sides], side_ends[sides])
+		hit[pairs[crossed]] = True
+		done = last
+	return hit
+
+# returns an (n, k) array which is True where segment i crosses polygon j, given the sides
+# and owners from polygon_sides for k polygons
+def segments_hit_each(starts, ends, side_starts, side_ends, owners, k):
+	hit = np.zeros((len(starts), k), dtype=bool)
+	if not len(side_starts):
+		return hit
+
+	# the sides of each polygon are next to each other, so each polygon's can be combined in one go
+	first_sides = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+	step = max(1, chunk_size // len(side_starts))
+	for i in range(0, len(starts), step):
+		crossed = crosses(starts[i:i + step], ends[i:i + step], side_starts, side_ends)
+		hit[i:i + step, owners[first_sides]] = np.logical_or.reduceat(crossed, first_sides, axis=1)
+	return hit
+
+# Checks for a point moving through space and time, rather than a segment at one instant.
+
+# the most steps first_contact takes towards a rotating obstacle before giving up and calling it a contact
+max_steps = 10000
+
+# returns the z component of the cross product of the (..., 2) arrays a and b
+def cross(a, b):
+	return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+# returns True if the point is inside the polygon, by counting the sides crossed by a ray to its right
+def inside(point, vertices):
+	x = point[0]
+	y = point[1]
+	ends = np.roll(vertices, -1, axis=0)
+	x_0, y_0 = vertices[:, 0], vertices[:, 1]
+	x_1, y_1 = ends[:, 0], ends[:, 1]
+
+	straddles = (y_0 > y) != (y_1 > y)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		cross_x = x_0 + (y - y_0) * (x_1 - x_0) / (y_1 - y_0)
+	return bool(np.count_nonzero(straddles & (cross_x > x)) % 2)
+
+# returns the distance from the point to the nearest side of the polygon
+def distance_to_sides(point, vertices):
+	sides = np.roll(vertices, -1, axis=0) - vertices
+	to_point = np.asarray(point, dtype=float) - vertices
+	along = np.clip((to_point * sides).sum(axis=1) / (sides * sides).sum(axis=1), 0, 1)
+	off = to_point - along[:, np.newaxis] * sides
+	return math.sqrt((off * off).sum(axis=1).min())
+
+# returns the distance from the point to the polygon, which is 0 inside it
+def distance(point, vertices):
+	if inside(point, vertices):
+		return 0.0
+	return distance_to_sides(point, vertices)
+
+# returns the fraction of the way along the segment p_0 -> p_1 it first touches the polygon, or None
+def first_touch(p_0, p_1, vertices):
+	if inside(p_0, vertices):
+		return 0.0
+
+	path = p_1 - p_0
+	sides = np.roll(vertices, -1, axis=0) - vertices
+	to_side = vertices - p_0
+
+	denom = cross(path, sides)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		along_path = cross(to_side, sides) / denom
+		along_side = cross(to_side, path) / denom
+		crossing = (denom != 0) & (along_path >= 0) & (along_path <= 1) & (along_side >= 0) & (along_side <= 1)
+
+	touches = list(along_path[crossing])
+
+	# a path running along a side's line touches it where the two overlap
+	path_sq = (path * path).sum()
+	collinear = (denom == 0) & (cross(to_side, path) == 0)
+	for i in np.flatnonzero(collinear):
+		if path_sq == 0:
+			return 0.0
+		u_0 = (to_side[i] * path).sum() / path_sq
+		u_1 = ((to_side[i] + sides[i]) * path).sum() / path_sq
+		if min(u_0, u_1) <= 1 and max(u_0, u_1) >= 0:
+			touches.append(max(0.0, min(u_0, u_1)))
+
+	return min(touches) if touches else None
+
+# returns the first time in [t_start, t_end] that a point moving in a straight line from start
+# (at t_start) to end (at t_end) touches the obstacle, or None if it stays clear the whole time
+# obstacles which only move are solved exactly; the point's path relative to them is a straight line
+# rotating obstacles are stepped towards by conservative advancement, and a contact is anywhere the
+# point comes within tolerance of them
+def first_contact(start, end, t_start, t_end, obstacle, tolerance=1e-3):
+	start = np.array((start[0], start[1]), dtype=float)
+	end = np.array((end[0], end[1]), dtype=float)
+	duration = t_end - t_start
+	velocity = np.array((obstacle.velocity[0], obstacle.velocity[1]), dtype=float)
+
+	if obstacle.velocity[2] == 0 or duration <= 0:
+		# in the obstacle's frame it stays where it was at t_start, and the point goes to
+		# wherever end is relative to it by t_end
+		if duration <= 0:
+			end = start
+		touch = first_touch(start, end - velocity * duration, obstacle_vertices(obstacle, t_start))
+		return None if touch is None else t_start + touch * duration
+
+	# no part of the obstacle moves faster than its center plus its spin, so the gap between it and
+	# the point can close no faster than speed; stepping by gap / speed can never step past a contact
+	point_velocity = (end - start) / duration
+	rel = point_velocity - velocity
+	speed = math.sqrt((rel * rel).sum()) + abs(obstacle.velocity[2]) * obstacle.radius()
+	if speed == 0:
+		speed = tolerance
+
+	t = t_start
+	for step in range(max_steps):
+		gap = distance(start + point_velocity * (t - t_start), obstacle_vertices(obstacle, t))
+		if gap <= tolerance:
+			return t
+		t += gap / speed
+		if t > t_end:
+			return None
+
+	return t
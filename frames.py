@@ -0,0 +1,250 @@
+import argparse
+import math
+import os
+import sys
+
+import numpy as np
+
+from treestore import spread
+
+# Draws what the Simulator's canvas would show into NumPy images, without Tkinter, so a planning run
+# can be turned into frames for a whole range of times and saved as images or a raw video stream.
+# Node labels and the timestamp aren't drawn, as there is no text.
+# Run as: python frames.py run.trace frames/ [--start 0 --end 10 --step .1]
+#     or: python frames.py run.trace --raw - | ffmpeg -f rawvideo -pix_fmt rgb24 -s 400x400 -i - run.mp4
+
+# the simulator's colors, as RGB
+colors = {
+	'white': (255, 255, 255),
+	'PaleGreen1': (154, 255, 154),
+	'salmon': (250, 128, 114),
+	'RoyalBlue1': (72, 118, 255),
+	'light blue': (173, 216, 230),
+	'steel blue': (70, 130, 180),
+	'green': (0, 255, 0),
+	'dodger blue': (30, 144, 255),
+	}
+
+# returns the (dy, dx) offsets of the pixels within radius of a pixel, as an (n, 2) array
+def disk(radius):
+	r = int(math.ceil(radius))
+	dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+	inside = dx**2 + dy**2 <= radius**2
+	return np.column_stack((dy[inside], dx[inside]))
+
+# colors the pixels within the offsets of each of the (n, 2) points
+def stamp(image, points, offsets, color):
+	if not len(points):
+		return
+	height, width = image.shape[:2]
+	centers = np.rint(points).astype(np.intp)
+	xs = (centers[:, 0:1] + offsets[:, 1]).ravel()
+	ys = (centers[:, 1:2] + offsets[:, 0]).ravel()
+	inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+	image[ys[inside], xs[inside]] = color
+
+# returns points every pixel or so along each segment, and the segment each point is on
+def sample_segments(starts, ends):
+	lengths = np.sqrt(((ends - starts)**2).sum(axis=1))
+	counts = np.ceil(lengths).astype(np.intp) + 1
+	segments = np.repeat(np.arange(len(starts)), counts)
+	firsts = np.repeat(np.cumsum(counts) - counts, counts)
+	fractions = (np.arange(counts.sum()) - firsts) / np.repeat(np.maximum(counts - 1, 1), counts).astype(float)
+	points = starts[segments] + fractions[:, np.newaxis] * (ends - starts)[segments]
+	return points, segments
+
+# colors the pixels whose centers are inside the polygon, given as a (k, 2) array of vertices
+def fill_polygon(image, vertices, color):
+	height, width = image.shape[:2]
+	x_0 = max(int(math.floor(vertices[:, 0].min())), 0)
+	y_0 = max(int(math.floor(vertices[:, 1].min())), 0)
+	x_1 = min(int(math.ceil(vertices[:, 0].max())), width - 1)
+	y_1 = min(int(math.ceil(vertices[:, 1].max())), height - 1)
+	if x_0 > x_1 or y_0 > y_1:
+		return
+
+	ys, xs = np.mgrid[y_0:y_1 + 1, x_0:x_1 + 1]
+	xs = xs + 0.5
+	ys = ys + 0.5
+
+	# counts how many sides a ray to the right of each pixel crosses, odd means inside
+	inside = np.zeros(xs.shape, dtype=bool)
+	sides_to = np.roll(vertices, -1, axis=0)
+	for (a_x, a_y), (b_x, b_y) in zip(vertices.tolist(), sides_to.tolist()):
+		if a_y == b_y:
+			continue
+		spans = (a_y > ys) != (b_y > ys)
+		crossing = a_x + (ys - a_y) * (b_x - a_x) / (b_y - a_y)
+		inside ^= spans & (xs < crossing)
+
+	image[y_0:y_1 + 1, x_0:x_1 + 1][inside] = color
+
+# draws the frames of a planned rrt: its obstacles, and its tree as it is at each time, coloured by
+# whether each connection is blocked then
+# path, if given, is the rows of the nodes along the path to the goal, as RRT.find_goal_path gives them,
+# drawn in blue from finish_time on
+class FrameRenderer(object):
+
+	line_width = 4
+	centroid_size = 3
+
+	def __init__(self, rrt, path=None, finish_time=-1, width=None, height=None):
+		self.rrt = rrt
+		self.width = int(width or rrt.width)
+		self.height = int(height or rrt.height)
+
+		self.path = path or []
+		self.finish_time = finish_time
+
+		self.line = disk(FrameRenderer.line_width / 2.0)
+		self.dot = disk(rrt.size)
+		self.centroid = disk(FrameRenderer.centroid_size)
+
+		self.nodes = 0 # how many nodes had been added to the tree when its shape was last worked out
+		self.prunes = 0 # and how many times it had been pruned
+
+	# works out the parts of the tree which don't change from frame to frame, if it has grown
+	def tree_shape(self):
+		store = self.rrt.store
+		if self.nodes == self.rrt.rrt_index and self.prunes == self.rrt.prunes:
+			return
+		self.nodes = self.rrt.rrt_index
+		self.prunes = self.rrt.prunes
+
+		self.ids, self.starts, self.ends = store.edges()
+		self.line_points, self.line_edges = sample_segments(self.starts, self.ends)
+		self.locations = store.locations()
+		self.arrivals = store.arrivals()
+		self.live = store.live[:store.count].copy()
+
+		on_path = np.zeros(store.count, dtype=bool)
+		on_path[self.path] = True
+		self.on_path = on_path
+
+	# returns the frame at time t as a (height, width, 3) array of RGB bytes
+	def render(self, t, vertices=None, centroids=None):
+		image = np.empty((self.height, self.width, 3), dtype=np.uint8)
+		image[:] = colors['white']
+
+		self.draw_tree(image, t)
+
+		if vertices is None:
+			vertices, centroids = self.obstacles_at([t])
+			vertices = [v[0] for v in vertices]
+			centroids = [c[0] for c in centroids]
+		for obstacle_vertices in vertices:
+			fill_polygon(image, obstacle_vertices, colors['light blue'])
+		stamp(image, np.array(centroids).reshape(-1, 2), self.centroid, colors['steel blue'])
+
+		base = self.rrt.base
+		goal = self.rrt.goal
+		stamp(image, np.array([[base[0], base[1]]]), self.dot, colors['green'])
+		stamp(image, np.array([[goal[0], goal[1]]]), self.dot, colors['dodger blue'])
+		return image
+
+	def draw_tree(self, image, t):
+		self.tree_shape()
+		if not len(self.locations):
+			return
+
+		# the nodes reached by time t, and whether they are valid at t
+		shown = (self.arrivals <= t) & self.live
+		blocked = np.zeros(len(self.locations), dtype=bool)
+		if len(self.ids):
+			blocked[self.ids] = self.rrt.edges_blocked(self.ids, self.starts, self.ends, t)
+		valid = spread(self.rrt.store.parent[:len(blocked)], blocked)
+
+		found = self.finish_time is not -1 and t >= self.finish_time
+		highlight = self.on_path if found else np.zeros(len(valid), dtype=bool)
+
+		# connections go under the nodes, and take the color of the node they lead to
+		line_nodes = self.ids[self.line_edges]
+		for color, rows in (('salmon', ~valid), ('PaleGreen1', valid), ('RoyalBlue1', highlight)):
+			on = (rows & shown)[line_nodes]
+			stamp(image, self.line_points[on], self.line, colors[color])
+		if found and self.path:
+			end = self.locations[self.path[0]]
+			points, segments = sample_segments(np.array([[end[0], end[1]]], dtype=float),
+				np.array([[self.rrt.goal[0], self.rrt.goal[1]]], dtype=float))
+			stamp(image, points, self.line, colors['RoyalBlue1'])
+
+		for color, rows in (('salmon', ~valid), ('PaleGreen1', valid), ('RoyalBlue1', highlight)):
+			stamp(image, self.locations[rows & shown], self.dot, colors[color])
+
+	# returns each obstacle's vertices and centroid at each of the times, see Shape.trajectory
+	def obstacles_at(self, times):
+		vertices = []
+		centroids = []
+		for obstacle in self.rrt.sim.obstacles:
+			obstacle_vertices, obstacle_centroids = obstacle.trajectory(times)
+			vertices.append(obstacle_vertices)
+			centroids.append(obstacle_centroids)
+		return vertices, centroids
+
+	# yields the frame at each of the times in turn
+	# the obstacles are moved for a batch of times at once
+	def frames(self, times, batch=64):
+		times = np.asarray(times, dtype=float)
+		for first in range(0, len(times), batch):
+			batch_times = times[first:first + batch]
+			vertices, centroids = self.obstacles_at(batch_times)
+			for i, t in enumerate(batch_times):
+				yield self.render(t, [v[i] for v in vertices], [c[i] for c in centroids])
+
+# writes the image as a binary PPM, which most image viewers and ffmpeg can read
+def write_ppm(out, image):
+	out.write(('P6\n%d %d\n255\n' % (image.shape[1], image.shape[0])).encode('ascii'))
+	out.write(image.tobytes())
+
+# saves a PPM for each of the times in directory, returns their paths
+def save_frames(renderer, times, directory, prefix='frame'):
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+
+	paths = []
+	for i, image in enumerate(renderer.frames(times)):
+		path = os.path.join(directory, '%s_%05d.ppm' % (prefix, i))
+		with open(path, 'wb') as out:
+			write_ppm(out, image)
+		paths.append(path)
+	return paths
+
+# writes the frames one after another as raw RGB bytes to out, for piping into a video encoder
+def write_stream(renderer, times, out):
+	count = 0
+	for image in renderer.frames(times):
+		out.write(image.tobytes())
+		count += 1
+	return count
+
+def main():
+	import traces
+
+	parser = argparse.ArgumentParser(description='Renders the frames of a recorded planning run.')
+	parser.add_argument('trace', help='trace file, see traces.py')
+	parser.add_argument('directory', nargs='?', help='where to save the frames as PPM images')
+	parser.add_argument('--raw', help='file to write raw RGB frames to instead, - for stdout')
+	parser.add_argument('--start', type=float, default=0)
+	parser.add_argument('--end', type=float, help='defaults to when the last node is reached')
+	parser.add_argument('--step', type=float, default=0.1)
+	args = parser.parse_args()
+
+	rrt, mismatches = traces.replay(args.trace, check=False)
+	end = args.end if args.end is not None else float(rrt.store.arrivals().max())
+	times = np.arange(args.start, end + args.step / 2.0, args.step)
+	# the soonest path the replayed tree has to the goal, drawn from when it gets there
+	path = rrt.best_goal_path()
+	finish_time = rrt.store.arrival(path[0]) if path else -1
+	renderer = FrameRenderer(rrt, path, finish_time)
+
+	if args.raw:
+		out = getattr(sys.stdout, 'buffer', sys.stdout) if args.raw == '-' else open(args.raw, 'wb')
+		write_stream(renderer, times, out)
+		out.flush()
+	elif args.directory:
+		save_frames(renderer, times, args.directory)
+	else:
+		parser.error('give a directory or --raw')
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,46 @@
+from spatial import KDTree
+
+# a node of the goal tree
+class GoalNode(object):
+	__slots__ = ('loc', 'parent', 'to_goal')
+
+	def __init__(self, loc, parent, to_goal):
+		self.loc = loc # (x, y)
+		self.parent = parent # the next node on the way to the goal, None for the goal itself
+		self.to_goal = to_goal # seconds it takes to travel from here to the goal
+
+	def __getitem__(self, index):
+		return self.loc[index]
+
+# A tree grown backwards from the goal, for RRT.bidirectional. Its nodes aren't given times: a way to
+# the goal through it is only checked against the obstacles once the RRT joins a node to it, at the
+# times the robot would travel it then (see RRT.join).
+class GoalTree(object):
+
+	def __init__(self, goal):
+		self.root = GoalNode((goal[0], goal[1]), None, 0.0)
+		self.nodes = [self.root]
+		self.index = KDTree(2)
+		self.index.insert(self.root.loc, self.root)
+
+	def __len__(self):
+		return len(self.nodes)
+
+	# adds a node at loc leading on to parent, returns it
+	def add(self, loc, parent, to_goal):
+		node = GoalNode(loc, parent, to_goal)
+		self.nodes.append(node)
+		self.index.insert(loc, node)
+		return node
+
+	# returns (node, squared distance) for the node nearest to loc
+	def nearest(self, loc):
+		return self.index.nearest((loc[0], loc[1]))
+
+	# returns the locations from node on to the goal
+	def way_to_goal(self, node):
+		way = []
+		while node is not None:
+			way.append(node.loc)
+			node = node.parent
+		return way
@@ -0,0 +1,120 @@
+import bisect
+import math
+
+import numpy as np
+
+import collision
+from spatial import overlaps
+from stats import timed
+
+# Works out ahead of time when each edge of the tree is blocked by an obstacle, as the sorted list of times
+# it switches between clear and blocked (times[edge]). It is blocked from the first time to the second,
+# the third to the fourth, and so on, so whether it is blocked at t is a binary search.
+# The obstacles are sampled every step seconds from t = 0, and each switch found between two samples
+# is narrowed down to within tolerance seconds. A block shorter than a step can be missed.
+# Edges are known by their edge id (see treestore.py), and whoever moves or removes an edge forgets it.
+class BlockedIntervals(object):
+
+	def __init__(self, obstacles, step, tolerance):
+		self.obstacles = obstacles
+		self.step = step
+		self.tolerance = tolerance
+
+		self.samples = 0 # how many sample times the obstacles' vertices are known for
+		self.vertices = [np.zeros((0, len(obstacle.points), 2)) for obstacle in obstacles]
+		self.times = {} # edge id -> when the edge starts and stops being blocked
+		self.until = {} # edge id -> how many of the samples its times cover
+
+		self.stats = None # set while the planner is profiling, see RRT.profile
+
+	# returns the number of samples needed to cover up to time t
+	def samples_to(self, t):
+		return int(math.ceil(t / self.step)) + 1
+
+	# makes sure the obstacles' vertices are known for the first count samples
+	def sample(self, count):
+		if count <= self.samples:
+			return
+
+		times = np.arange(self.samples, count) * self.step
+		for i, obstacle in enumerate(self.obstacles):
+			new_vertices = obstacle.trajectory(times)[0]
+			self.vertices[i] = np.concatenate((self.vertices[i], new_vertices))
+		self.samples = count
+
+	# returns True if the edge from start to end is blocked at time t
+	def blocked(self, edge, start, end, t):
+		self.fill(edge, start, end, t)
+		return bisect.bisect_right(self.times[edge], t) % 2 == 1
+
+	# returns True if the segment from start to end, which isn't an edge of the tree, is blocked at time t
+	# nothing is kept for it
+	def segment_blocked(self, start, end, t):
+		times = []
+		self.extend(times, 0, start, end, t)
+		return bisect.bisect_right(times, t) % 2 == 1
+
+	# works out when the edge from start to end is blocked up to time t, carrying on from where it got to before
+	@timed('intervals')
+	def fill(self, edge, start, end, t):
+		if edge not in self.times:
+			self.times[edge] = []
+		self.until[edge] = self.extend(self.times[edge], self.until.get(edge, 0), start, end, t)
+
+	# drops what is known about an edge, once it has moved or been removed
+	def forget(self, edge):
+		self.times.pop(edge, None)
+		self.until.pop(edge, None)
+
+	# adds the switches of the segment from start to end onto times, which covers the first samples,
+	# up to time t, returns how many samples times covers then
+	def extend(self, times, first, start, end, t):
+		count = self.samples_to(t)
+		if count <= first:
+			return first
+		self.sample(count)
+
+		bounds = (min(start[0], end[0]), min(start[1], end[1]), max(start[0], end[0]), max(start[1], end[1]))
+		start = np.array([[start[0], start[1]]], dtype=float)
+		end = np.array([[end[0], end[1]]], dtype=float)
+
+		# only the obstacles which come near the segment over these samples can block it
+		t_first = max(first - 1, 0) * self.step
+		near = [i for i, obstacle in enumerate(self.obstacles)
+			if overlaps(obstacle.bounds(t_first, (count - 1) * self.step), bounds)]
+
+		states = np.zeros(count - first, dtype=bool)
+		for i in near:
+			vertices = self.vertices[i][first:count]
+			side_ends = np.roll(vertices, -1, axis=1)
+			crossed = collision.crosses(start, end, vertices.reshape(-1, 2), side_ends.reshape(-1, 2))
+			if self.stats:
+				self.stats.add('side_tests', len(crossed))
+			states |= crossed.reshape(len(states), -1).any(axis=1)
+
+		was_blocked = len(times) % 2 == 1
+		for k in np.flatnonzero(states != np.r_[was_blocked, states[:-1]]):
+			k += first
+			if k == 0:
+				times.append(0.0)
+			else:
+				times.append(self.switch_time(start, end, near, (k - 1) * self.step, k * self.step))
+		return count
+
+	# narrows down when the segment switches between t_before and t_after to within tolerance,
+	# returning the earliest time known to be after the switch
+	def switch_time(self, start, end, near, t_before, t_after):
+		was_blocked = self.hit_at(start, end, near, t_before)
+		while t_after - t_before > self.tolerance:
+			t = (t_before + t_after) / 2.0
+			if self.hit_at(start, end, near, t) is was_blocked:
+				t_before = t
+			else:
+				t_after = t
+		return t_after
+
+	# returns True if the segment crosses any of the near obstacles at time t
+	def hit_at(self, start, end, near, t):
+		polygons = [collision.obstacle_vertices(self.obstacles[i], t) for i in near]
+		side_starts, side_ends, owners = collision.polygon_sides(polygons)
+		return bool(collision.segments_hit(start, end, side_starts, side_ends)[0])
@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 # vector[0] = x; vector[1] = y; vector[2] = theta
 class Vector(object):
 
@@ -57,6 +59,184 @@ class Vector(object):
 
 		return Vector(tuple(new_vector))
 
+# a 2D vector which works the same as Vector, but keeps its coordinates in slots
+# so that each operation only builds the one new vector it returns
+class Vector2(object):
+	__slots__ = ('x', 'y')
+
+	def __init__(self, x, y):
+		self.x = x
+		self.y = y
+
+	def __str__(self):
+		return str((self.x, self.y))
+
+	@property
+	def coords(self):
+		return (self.x, self.y)
+
+	def __getitem__(self, index):
+		if index == 0:
+			return self.x
+		if index == 1:
+			return self.y
+		return (self.x, self.y)[index]
+
+	def __setitem__(self, index, val):
+		if index == 0:
+			self.x = val
+		elif index == 1:
+			self.y = val
+		else:
+			raise IndexError(index)
+		return self
+
+	def __len__(self):
+		return 2
+
+	def len(self):
+		return math.sqrt(self.x**2.0 + self.y**2.0)
+
+	def scalar(self, scalar):
+		return Vector2(self.x * scalar, self.y * scalar)
+
+	def add(self, other):
+		return Vector2(self.x + other[0], self.y + other[1])
+
+	def subtract(self, other):
+		return Vector2(self.x - other[0], self.y - other[1])
+
+	# the in place versions change this vector rather than making a new one, and return it
+
+	def iscalar(self, scalar):
+		self.x *= scalar
+		self.y *= scalar
+		return self
+
+	def iadd(self, other):
+		self.x += other[0]
+		self.y += other[1]
+		return self
+
+	def isubtract(self, other):
+		self.x -= other[0]
+		self.y -= other[1]
+		return self
+
+# a 3D vector which works the same as Vector, see Vector2
+class Vector3(object):
+	__slots__ = ('x', 'y', 'z')
+
+	def __init__(self, x, y, z):
+		self.x = x
+		self.y = y
+		self.z = z
+
+	def __str__(self):
+		return str((self.x, self.y, self.z))
+
+	@property
+	def coords(self):
+		return (self.x, self.y, self.z)
+
+	def __getitem__(self, index):
+		if index == 0:
+			return self.x
+		if index == 1:
+			return self.y
+		if index == 2:
+			return self.z
+		return (self.x, self.y, self.z)[index]
+
+	def __setitem__(self, index, val):
+		if index == 0:
+			self.x = val
+		elif index == 1:
+			self.y = val
+		elif index == 2:
+			self.z = val
+		else:
+			raise IndexError(index)
+		return self
+
+	def __len__(self):
+		return 3
+
+	def len(self):
+		return math.sqrt(self.x**2.0 + self.y**2.0 + self.z**2.0)
+
+	def scalar(self, scalar):
+		return Vector3(self.x * scalar, self.y * scalar, self.z * scalar)
+
+	def add(self, other):
+		return Vector3(self.x + other[0], self.y + other[1], self.z + other[2])
+
+	def subtract(self, other):
+		return Vector3(self.x - other[0], self.y - other[1], self.z - other[2])
+
+	def iscalar(self, scalar):
+		self.x *= scalar
+		self.y *= scalar
+		self.z *= scalar
+		return self
+
+	def iadd(self, other):
+		self.x += other[0]
+		self.y += other[1]
+		self.z += other[2]
+		return self
+
+	def isubtract(self, other):
+		self.x -= other[0]
+		self.y -= other[1]
+		self.z -= other[2]
+		return self
+
+# returns the Euclidean distance between the x and y of a and b, without building a vector
+# gives the same as a.subtract(b).len() for 2D vectors
+def distance(a, b):
+	return math.sqrt((a[0] - b[0])**2.0 + (a[1] - b[1])**2.0)
+
+# many vectors of the same length, kept as the rows of an (n, k) NumPy array so they can be
+# worked on together; indexing gives back a single vector, as with a tuple of vectors
+class VectorArray(object):
+
+	def __init__(self, coords):
+		self.coords = np.array(coords, dtype=float).reshape(len(coords), -1)
+
+	def __str__(self):
+		return str(self.coords.tolist())
+
+	def __getitem__(self, index):
+		return Vector(tuple(self.coords[index].tolist()))
+
+	def __len__(self):
+		return len(self.coords)
+
+	# the Euclidean length of every vector
+	def len(self):
+		return np.sqrt((self.coords**2.0).sum(axis=1))
+
+	def scalar(self, scalar):
+		return VectorArray(self.coords * scalar)
+
+	# other can be a single vector, which is added to every one, or a VectorArray of the same length
+	def add(self, other):
+		return VectorArray(self.coords + array_of(other))
+
+	def subtract(self, other):
+		return VectorArray(self.coords - array_of(other))
+
+	# returns every vector multiplied by the matrix
+	def transform(self, matrix):
+		return VectorArray(matrix.transform(self.coords))
+
+# returns the coordinates of a vector or VectorArray as a NumPy array
+def array_of(vectors):
+	if isinstance(vectors, VectorArray):
+		return vectors.coords
+	return np.array([vectors[i] for i in range(len(vectors))], dtype=float)
+
 class Shape(object):
 	# Takes an tuple of vectors defining the corners of the shape relative to the center, 
 	# clockwise from UL; where the center starts; and a velocity that the shape is moving at
@@ -67,7 +247,7 @@ class Shape(object):
 		# append a zero for rotation if needed
 		for point in points:
 			if len(point) is 2:
-				points3.append(Vector((point[0], point[1], 0)))
+				points3.append(Vector3(point[0], point[1], 0))
 			else:
 				points3.append(point)
 
@@ -75,6 +255,10 @@ class Shape(object):
 		self.velocity = velocity
 		self.t0 = t0 # position at t = 0
 
+		# these don't change as the shape moves, so are only worked out once, see area and local_centroid
+		self.area_value = None
+		self.local_center = None
+
 	def __str__(self):
 		str_list = []
 		for point in self.points:
@@ -84,11 +268,28 @@ class Shape(object):
 	# returns the location of the shape at the given time t
 	# as r(t) = integral(vdt, 0, t) = vt + initial position
 	def location(self, t):
-		return Vector((
-			self.velocity[0] * t + self.t0[0], 
+		return Vector3(
+			self.velocity[0] * t + self.t0[0],
 			self.velocity[1] * t + self.t0[1],
-			self.velocity[2] * t + self.t0[2]
-			))
+			self.velocity[2] * t + self.t0[2])
+
+	# returns True if the shape moves or rotates at all
+	def moving(self):
+		return self.velocity[0] != 0 or self.velocity[1] != 0 or self.velocity[2] != 0
+
+	# the distance from the center to the furthest point, so the shape always lies within
+	# this distance of its location however it has rotated
+	def radius(self):
+		return max(math.sqrt(point[0]**2.0 + point[1]**2.0) for point in self.points)
+
+	# returns the bounding box (x0, y0, x1, y1) of everywhere the shape goes between t_start and t_end
+	# its location moves in a straight line, so the box around both ends covers the whole way
+	def bounds(self, t_start, t_end):
+		r = self.radius()
+		start = self.location(t_start)
+		end = self.location(t_end)
+		return (min(start[0], end[0]) - r, min(start[1], end[1]) - r,
+			max(start[0], end[0]) + r, max(start[1], end[1]) + r)
 
 	# returns the shape's points, relative to the canvas NOT the center at time = t
 	# this is the very important function that returns coordinates for drawing the obstacle!
@@ -108,9 +309,9 @@ class Shape(object):
 	# returns the shape, rotated by a (measured in radians)
 	def rotate(self, a):
 		rot_matrix = Matrix((
-			Vector((math.cos(a), math.sin(a), 0)),
-			Vector((-math.sin(a), math.cos(a), 0)),
-			Vector((0, 0, 1))
+			Vector3(math.cos(a), math.sin(a), 0),
+			Vector3(-math.sin(a), math.cos(a), 0),
+			Vector3(0, 0, 1)
 			))
 
 		new_points = []
@@ -122,36 +323,207 @@ class Shape(object):
 		return Shape(tuple(new_points), self.t0, self.velocity)
 
 	# finds the centroid (center of mass) of the shape at time t
-	# see: https://en.wikipedia.org/wiki/Centroid#Of_a_polygon
 	def centroid(self, t):
-		# appends the first point to the end of the list, required for this
-		looped = list(self.points)
-		looped.append(self.points[0])
-
-		area = self.area()
-		c_x = 0
-		c_y = 0
-		for i in range(0, len(looped) - 1):
-			c_x += ((looped[i][0] + looped[i+1][0]) * 
-				(looped[i][0]*looped[i+1][1] - looped[i+1][0]*looped[i][1]))
-			c_y += ((looped[i][1] + looped[i+1][1]) * 
-				(looped[i][0]*looped[i+1][1] - looped[i+1][0]*looped[i][1]))
-
-		c_x *= 1.0/(6.0*area)
-		c_y *= 1.0/(6.0*area)
-		return Vector((c_x + self.velocity[0] * t, c_y + self.velocity[1] * t))
+		c_x, c_y = self.local_centroid()
+		return Vector2(c_x + self.velocity[0] * t, c_y + self.velocity[1] * t)
+
+	# finds the centroid of the points relative to the center
+	# see: https://en.wikipedia.org/wiki/Centroid#Of_a_polygon
+	def local_centroid(self):
+		if self.local_center is None:
+			# appends the first point to the end of the list, required for this
+			looped = list(self.points)
+			looped.append(self.points[0])
+
+			area = self.area()
+			c_x = 0
+			c_y = 0
+			for i in range(0, len(looped) - 1):
+				c_x += ((looped[i][0] + looped[i+1][0]) * 
+					(looped[i][0]*looped[i+1][1] - looped[i+1][0]*looped[i][1]))
+				c_y += ((looped[i][1] + looped[i+1][1]) * 
+					(looped[i][0]*looped[i+1][1] - looped[i+1][0]*looped[i][1]))
+
+			c_x *= 1.0/(6.0*area)
+			c_y *= 1.0/(6.0*area)
+			self.local_center = (c_x, c_y)
+
+		return self.local_center
 
 	# Finds the area of the shape
 	# This differs from the signed area, as area below the x axis is still positive here
 	# see: https://en.wikipedia.org/wiki/Shoelace_formula
 	def area(self):
-		area = 0
-		j = len(self.points) - 1
-		for i in range(0, len(self.points)):
-			area += (self.points[j][0] + self.points[i][0]) * (self.points[j][1] - self.points[i][1])
-			j = i
+		if self.area_value is None:
+			area = 0
+			j = len(self.points) - 1
+			for i in range(0, len(self.points)):
+				area += (self.points[j][0] + self.points[i][0]) * (self.points[j][1] - self.points[i][1])
+				j = i
+
+			self.area_value = abs(area / 2)
+
+		return self.area_value
+
+	# returns where the shape is at each of the times in one go, as an (n_times, n_points, 2) array of
+	# the points absolute_pos gives and an (n_times, 2) array of the centroid, placed where the
+	# simulator draws it (centroid(t) + t0)
+	def trajectory(self, times):
+		times = np.asarray(times, dtype=float).reshape(-1)
+		local = np.array([(point[0], point[1], point[2]) for point in self.points], dtype=float)
+		t0 = np.array([self.t0[i] for i in range(3)], dtype=float)
+		velocity = np.array([self.velocity[i] for i in range(3)], dtype=float)
+
+		vertices = move_points(local, times[:, np.newaxis], t0, velocity)
+		centroids = move_centroids(np.array(self.local_centroid(), dtype=float), times, t0, velocity)
+		return vertices, centroids
+
+# moves points the same way Shape.absolute_pos does, for many times and shapes at once
+# local holds (..., 3) points relative to their centers, and is broadcast against the times
+# and the (..., 3) t0 and velocity of the shape each point belongs to
+def move_points(local, times, t0, velocity):
+	angles = velocity[..., 2] * times + t0[..., 2]
+	cos = np.cos(angles)
+	sin = np.sin(angles)
+
+	# the same sums as Matrix.mult3 with the rotation from Shape.rotate, then adding the location
+	x = local[..., 0]
+	y = local[..., 1]
+	z = local[..., 2]
+	rotated_x = cos * x + (-sin) * y + 0.0 * z
+	rotated_y = sin * x + cos * y + 0.0 * z
+	return np.stack((
+		(velocity[..., 0] * times + t0[..., 0]) + rotated_x,
+		(velocity[..., 1] * times + t0[..., 1]) + rotated_y), axis=-1)
+
+# moves (..., 2) local centroids to where the simulator draws them (Shape.centroid(t) + t0),
+# broadcast against the times and the (..., 3) t0 and velocity of their shapes
+def move_centroids(center, times, t0, velocity):
+	return np.stack((
+		(center[..., 0] + velocity[..., 0] * times) + t0[..., 0],
+		(center[..., 1] + velocity[..., 1] * times) + t0[..., 1]), axis=-1)
+
+# many shapes kept as packed arrays: every shape's points one after another, with offsets giving
+# where each shape's points start and end, so they can all be moved at once
+# it can also be used as a tuple of Shapes, which are only built when they're asked for
+class ShapeSet(object):
+
+	# points is (n_points, 2) or (n_points, 3), offsets is (n_shapes + 1,), t0 and velocity are (n_shapes, 3)
+	def __init__(self, points, offsets, t0, velocity):
+		points = np.asarray(points, dtype=float)
+		if points.shape[1] == 2:
+			points = np.column_stack((points, np.zeros(len(points))))
+		self.points = points
+		self.offsets = np.asarray(offsets, dtype=np.intp)
+		self.t0 = np.asarray(t0, dtype=float)
+		self.velocity = np.asarray(velocity, dtype=float)
+
+		self.shapes = [None] * (len(self.offsets) - 1)
+		self.local_centers = None
+		self.radius_values = None
 
-		return abs(area / 2)
+	def __len__(self):
+		return len(self.shapes)
+
+	# returns the Shape at index, built the first time it's asked for so it's always the same object
+	def __getitem__(self, index):
+		if index < 0:
+			index += len(self.shapes)
+		shape = self.shapes[index]
+
+		if shape is None:
+			first = self.offsets[index]
+			last = self.offsets[index + 1]
+			points = tuple(Vector3(x, y, z) for x, y, z in self.points[first:last].tolist())
+			shape = Shape(points, Vector3(*self.t0[index].tolist()), Vector3(*self.velocity[index].tolist()))
+			self.shapes[index] = shape
+
+		return shape
+
+	def __iter__(self):
+		for i in range(len(self.shapes)):
+			yield self[i]
+
+	# returns the index of the shape each point belongs to
+	def owners(self):
+		return np.repeat(np.arange(len(self.shapes)), np.diff(self.offsets))
+
+	# the centroid of each shape's points relative to its center, as Shape.local_centroid
+	def local_centroids(self):
+		if self.local_centers is None:
+			x = self.points[:, 0]
+			y = self.points[:, 1]
+
+			# the index of the point after each one, looping back to the start of its shape
+			after = np.arange(len(x)) + 1
+			after[self.offsets[1:] - 1] = self.offsets[:-1]
+			before = np.argsort(after)
+
+			starts = self.offsets[:-1]
+			area = np.abs(np.add.reduceat((x[before] + x) * (y[before] - y), starts) / 2)
+			cross = x * y[after] - x[after] * y
+			c_x = np.add.reduceat((x + x[after]) * cross, starts) * (1.0 / (6.0 * area))
+			c_y = np.add.reduceat((y + y[after]) * cross, starts) * (1.0 / (6.0 * area))
+			self.local_centers = np.column_stack((c_x, c_y))
+
+		return self.local_centers
+
+	# whether each shape moves or rotates at all, as Shape.moving
+	def moving(self):
+		return (self.velocity != 0).any(axis=1)
+
+	# the distance from each shape's center to its furthest point, as Shape.radius
+	def radii(self):
+		if self.radius_values is None:
+			dists = np.sqrt(self.points[:, 0]**2.0 + self.points[:, 1]**2.0)
+			self.radius_values = np.maximum.reduceat(dists, self.offsets[:-1])
+		return self.radius_values
+
+	# the box everywhere each shape goes between t_start and t_end, as Shape.bounds,
+	# as an (n_shapes, 4) array of (x0, y0, x1, y1)
+	def bounds(self, t_start, t_end):
+		r = self.radii()[:, np.newaxis]
+		start = self.velocity[:, :2] * t_start + self.t0[:, :2]
+		end = self.velocity[:, :2] * t_end + self.t0[:, :2]
+		return np.column_stack((np.minimum(start, end) - r, np.maximum(start, end) + r))
+
+	# returns where every shape is at each of the times, as an (n_times, n_points, 2) array of every
+	# shape's points (split up by offsets) and an (n_times, n_shapes, 2) array of centroids,
+	# see Shape.trajectory
+	def trajectory(self, times):
+		times = np.asarray(times, dtype=float).reshape(-1)[:, np.newaxis]
+		owners = self.owners()
+
+		vertices = move_points(self.points, times, self.t0[owners], self.velocity[owners])
+		centroids = move_centroids(self.local_centroids(), times, self.t0, self.velocity)
+		return vertices, centroids
+
+	# returns the (n_points, 2) array of every shape's points at time t
+	def vertices_at(self, t):
+		return self.trajectory([t])[0][0]
+
+	# returns the points of the shapes at the indexes at time t, as vertices_at gives them, and the offsets
+	# of each of those shapes' points in them
+	def vertices_of(self, indexes, t):
+		counts = self.offsets[indexes + 1] - self.offsets[indexes]
+		offsets = np.r_[0, np.cumsum(counts)]
+		owners = np.repeat(indexes, counts)
+		points = np.repeat(self.offsets[indexes] - offsets[:-1], counts) + np.arange(offsets[-1])
+		times = np.array([[t]], dtype=float)
+		vertices = move_points(self.points[points], times, self.t0[owners], self.velocity[owners])[0]
+		return vertices, offsets
+
+# packs a sequence of Shapes into a ShapeSet
+def shape_set(shapes):
+	points = []
+	offsets = [0]
+	for shape in shapes:
+		points.extend((point[0], point[1], point[2]) for point in shape.points)
+		offsets.append(len(points))
+
+	return ShapeSet(np.array(points, dtype=float).reshape(-1, 3), offsets,
+		[[shape.t0[i] for i in range(3)] for shape in shapes],
+		[[shape.velocity[i] for i in range(3)] for shape in shapes])
 
 class Matrix(object):
 
@@ -167,6 +539,9 @@ class Matrix(object):
 
 	# multiplies the matrix by the vector
 	def mult(self, vector):
+		if len(vector) == 3 and len(self.values) == 3:
+			return self.mult3(vector)
+
 		result = Vector((0,) * len(vector)) # tuple of the length of the vector
 
 		for i in range(0, len(vector)):
@@ -176,4 +551,19 @@ class Matrix(object):
 			result_col = col.scalar(vector_val)
 			result = result.add(result_col)
 
-		return result
\ No newline at end of file
+		return result
+
+	# mult for a 3x3 matrix, working on the numbers directly rather than building a vector per column
+	# adds the columns up in the same order as mult, so gives exactly the same result
+	def mult3(self, vector):
+		col_0, col_1, col_2 = self.values
+		v_0, v_1, v_2 = vector[0], vector[1], vector[2]
+		return Vector3(
+			col_0[0] * v_0 + col_1[0] * v_1 + col_2[0] * v_2,
+			col_0[1] * v_0 + col_1[1] * v_1 + col_2[1] * v_2,
+			col_0[2] * v_0 + col_1[2] * v_1 + col_2[2] * v_2)
+
+	# returns the (n, k) array of points, each multiplied by the matrix, in one go
+	def transform(self, points):
+		columns = np.array([[col[i] for i in range(len(col))] for col in self.values], dtype=float)
+		return np.dot(np.asarray(points, dtype=float), columns)
@@ -0,0 +1,177 @@
+import random
+import time
+
+import numpy as np
+
+from linalgebra import *
+from rrt import RRT
+
+# stands in for the Simulator when there is nothing to draw to
+class Scene(object):
+	def __init__(self, obstacles):
+		self.obstacles = obstacles
+
+	# nothing is displayed when planning headless
+	def display_sim(self, t, event=None):
+		pass
+
+# the outcome of a planning run
+class PlanResult(object):
+	def __init__(self, path, finish_time, t, steps, nodes, elapsed):
+		self.path = path # (x, y, arrival time) for each node along the path, from the base, see freeze
+		self.finish_time = finish_time # the time the path reaches the goal, -1 if not found
+		self.t = t # the time the planner stepped to
+		self.steps = steps
+		self.nodes = nodes
+		self.elapsed = elapsed # wall clock seconds spent planning
+
+	def __str__(self):
+		return ("Plan: [" + str(self.found()) + " " + str(self.finish_time) + " (" +
+			str(self.nodes) + " nodes, " + str(self.steps) + " steps, " + str(self.elapsed) + "s) ]")
+
+	def found(self):
+		return self.finish_time is not -1
+
+	# returns the path as (x, y, arrival time) for each node along it, from the base
+	def waypoints(self):
+		return list(self.path)
+
+# plans a path through the obstacles without a display, stepping the RRT forwards in time
+# in the same way the Simulator's slider does
+class Planner(object):
+
+	# seed, if given, seeds both random number generators the RRT draws from
+	# width and height, if given, set the area the tree can grow in
+	def __init__(self, obstacles, base, goal, max_time=30, time_step=RRT.time_step, seed=None,
+			width=None, height=None):
+		if seed is not None:
+			random.seed(seed)
+			np.random.seed(seed)
+		self.seed = seed
+
+		self.rrt = RRT(None)
+		self.rrt.base = base
+		self.rrt.goal = goal
+		self.rrt.sim = Scene(obstacles)
+		if width:
+			self.rrt.width = width
+		if height:
+			self.rrt.height = height
+
+		self.max_time = max_time
+		self.time_step = time_step
+
+		self.t = 0
+		self.steps = 0
+		self.elapsed = 0
+
+		self.finish_time = -1
+		self.visited = None # the path to the goal once found, see freeze
+		self.anytime = False # whether plan was given a deadline, see plan
+
+		start = time.time()
+		self.rrt.create_rrt()
+		self.elapsed += time.time() - start
+
+	# moves forwards one time step, growing the tree
+	# returns the path to the goal once it has been found, see freeze
+	def step(self):
+		start = time.time()
+
+		self.steps += 1
+		# multiplying rather than adding keeps the times the same as the slider's
+		self.t = self.steps * self.time_step
+		visited = self.rrt.update(self.t)
+
+		if visited and self.finish_time is -1 and not self.anytime:
+			self.finish_time = self.rrt.store.arrival(visited[0])
+			self.visited = freeze(self.rrt, visited)
+
+		self.elapsed += time.time() - start
+		return self.visited
+
+	# moves the goal, carrying on with the tree grown so far rather than starting again, see RRT.retarget
+	# returns the path to the new goal if the tree already reaches it, as step does
+	# planning carries on from the current time, so max_time may need raising to give it longer
+	def replan(self, goal):
+		start = time.time()
+
+		self.finish_time = -1
+		self.visited = None
+		visited = self.rrt.retarget(goal, self.t)
+		if self.anytime:
+			self.keep_best()
+		elif visited:
+			self.finish_time = self.rrt.store.arrival(visited[0])
+			self.visited = freeze(self.rrt, visited)
+
+		self.elapsed += time.time() - start
+		return self.visited
+
+	# records the planning from here on to a trace file at path, see traces.py
+	# the trace is closed when plan finishes, or by calling self.rrt.trace.close()
+	def record(self, path):
+		import traces
+		return traces.record(self.rrt, path, self.seed)
+
+	# steps until a path is found or max_time is reached
+	# given a deadline in seconds, plans anytime instead: grows the tree to max_time with rewiring, then
+	# spends what's left rewiring it further, returning the path which reaches the goal soonest out of
+	# those found by the deadline which stay clear of the obstacles the whole way
+	# the deadline is checked between steps and between nodes while rewiring
+	def plan(self, deadline=None):
+		if deadline is None:
+			while self.finish_time is -1 and self.t < self.max_time:
+				self.step()
+		else:
+			self.plan_until(time.time() + deadline)
+		if self.rrt.trace:
+			self.rrt.trace.close()
+		return self.result()
+
+	# plans anytime until the wall clock reaches stop, or rewiring stops making any node sooner
+	def plan_until(self, stop):
+		self.anytime = True
+		self.rrt.rewiring = True
+		self.keep_best()
+
+		while time.time() < stop:
+			if self.t < self.max_time:
+				self.step()
+			elif not self.rewire_all(stop):
+				break
+
+			start = time.time()
+			self.keep_best()
+			self.elapsed += time.time() - start
+
+	# tries rewiring every node once, or until the wall clock reaches stop
+	# returns True if any node was made sooner
+	def rewire_all(self, stop):
+		start = time.time()
+		changed = self.rrt.rewire_all(self.t, stop)
+		self.elapsed += time.time() - start
+		return changed
+
+	# keeps the tree's best path to the goal if it gets there sooner than the one kept so far
+	def keep_best(self):
+		path = self.rrt.best_goal_path()
+		if path:
+			finish_time = self.rrt.store.arrival(path[0])
+			if self.finish_time is -1 or finish_time < self.finish_time:
+				self.finish_time = finish_time
+				self.visited = freeze(self.rrt, path)
+
+	def result(self):
+		return PlanResult(self.visited or [], self.finish_time, self.t, self.steps, len(self.rrt.store), self.elapsed)
+
+# copies where and when the robot reaches each node along a path, as the edge ids find_goal_path gives,
+# into (x, y, arrival time) from the base on, so rewiring or pruning the tree afterwards doesn't change it
+def freeze(rrt, path):
+	store = rrt.store
+	nodes = [int(store.parent[path[-1]])] + list(reversed(path))
+	return [store.loc(node) + (store.arrival(node),) for node in nodes]
+
+# plans a path from base to goal through the obstacles, see Planner.plan for deadline
+def plan(obstacles, base, goal, max_time=30, time_step=RRT.time_step, seed=None, deadline=None):
+	return Planner(obstacles, base, goal, max_time, time_step, seed).plan(deadline)
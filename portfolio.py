@@ -0,0 +1,81 @@
+import multiprocessing
+import time
+
+from planner import Planner
+
+# Runs several planners at once with different seeds across a pool of processes, since how quickly
+# one finds a path depends a lot on its random draws. Each process is given the obstacles once when
+# it starts, and only seeds and results are passed back and forth after that.
+
+# the scene each worker process plans in, set by start_worker
+worker_scene = None
+
+def start_worker(obstacles, base, goal, max_time):
+	global worker_scene
+	worker_scene = (obstacles, base, goal, max_time)
+
+# plans with the given seed in a worker process, returning what's needed to build a PortfolioResult
+def run_seed(seed):
+	obstacles, base, goal, max_time = worker_scene
+	result = Planner(obstacles, base, goal, max_time, seed=seed).plan()
+	return (seed, result.finish_time, result.waypoints(), result.steps, result.nodes, result.elapsed)
+
+# the outcome of a portfolio run, the best of the planners which finished
+class PortfolioResult(object):
+	def __init__(self, seed, finish_time, waypoints, steps, nodes, elapsed, runs, wall_time):
+		self.seed = seed # the seed of the planner which found this path, None if none did
+		self.finish_time = finish_time # -1 if no path was found
+		self.waypoints = waypoints # (x, y, arrival time) for each node along the path, see PlanResult
+		self.steps = steps
+		self.nodes = nodes
+		self.elapsed = elapsed # seconds the winning planner spent
+		self.runs = runs # how many planners finished before the portfolio stopped
+		self.wall_time = wall_time # seconds the whole portfolio took
+
+	def __str__(self):
+		return ("Portfolio: [" + str(self.found()) + " " + str(self.finish_time) + " (seed " +
+			str(self.seed) + ", " + str(self.runs) + " runs, " + str(self.wall_time) + "s) ]")
+
+	def found(self):
+		return self.finish_time is not -1
+
+# plans from base to goal with runs differently seeded planners over workers processes
+# with no budget, returns the first path found; with a budget in seconds, returns the path which
+# reaches the goal soonest out of those found by then
+# either way the planners still running are stopped
+def plan_portfolio(obstacles, base, goal, max_time=30, workers=None, runs=None, budget=None, first_seed=0):
+	workers = workers or multiprocessing.cpu_count()
+	runs = runs or workers
+	start = time.time()
+
+	pool = multiprocessing.Pool(workers, start_worker, (obstacles, base, goal, max_time))
+	try:
+		results = pool.imap_unordered(run_seed, range(first_seed, first_seed + runs))
+
+		best = None
+		finished = 0
+		while finished < runs:
+			if budget is None:
+				result = results.next()
+			else:
+				remaining = budget - (time.time() - start)
+				if remaining <= 0:
+					break
+				try:
+					result = results.next(timeout=remaining)
+				except multiprocessing.TimeoutError:
+					break
+
+			finished += 1
+			if result[1] is not -1 and (best is None or result[1] < best[1]):
+				best = result
+				if budget is None:
+					break
+	finally:
+		pool.terminate()
+		pool.join()
+
+	wall_time = time.time() - start
+	if best is None:
+		return PortfolioResult(None, -1, [], 0, 0, 0, finished, wall_time)
+	return PortfolioResult(*(best + (finished, wall_time)))
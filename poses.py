@@ -0,0 +1,66 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from stats import timed
+
+# remembers where each obstacle is at the times it has been asked about, so that the planner and
+# the simulator don't rebuild the same rotated shape over and over
+# once more than size poses are kept, the least recently used is dropped
+class PoseCache(object):
+
+	def __init__(self, size=4096):
+		self.size = size
+		self.poses = OrderedDict() # (obstacle, t) -> [absolute shape, vertex array or None]
+
+		self.hits = 0
+		self.misses = 0
+
+		self.stats = None # set while the planner is profiling, see RRT.profile
+
+	def __len__(self):
+		return len(self.poses)
+
+	# returns the cache entry for the obstacle at time t, working it out if needed
+	def pose(self, obstacle, t):
+		key = (obstacle, t)
+		pose = self.poses.pop(key, None)
+
+		if pose is None:
+			self.misses += 1
+			pose = [self.work_out(obstacle, t), None]
+			if len(self.poses) >= self.size:
+				self.poses.popitem(last=False)
+		else:
+			self.hits += 1
+			if self.stats:
+				self.stats.add('pose_hits')
+
+		# (re)inserting puts it at the most recently used end
+		self.poses[key] = pose
+		return pose
+
+	# works out a pose the cache doesn't have
+	@timed('poses')
+	def work_out(self, obstacle, t):
+		if self.stats:
+			self.stats.add('pose_misses')
+		return obstacle.absolute_pos(t)
+
+	# returns obstacle.absolute_pos(t)
+	def absolute_pos(self, obstacle, t):
+		return self.pose(obstacle, t)[0]
+
+	# returns the (k, 2) array of the obstacle's vertices at time t
+	def vertices(self, obstacle, t):
+		pose = self.pose(obstacle, t)
+		if pose[1] is None:
+			pose[1] = np.array([(point[0], point[1]) for point in pose[0].points], dtype=float)
+		return pose[1]
+
+	def clear(self):
+		self.poses.clear()
+
+	# returns the cache's counters
+	def stats(self):
+		return {'hits': self.hits, 'misses': self.misses, 'size': len(self.poses)}
@@ -1,11 +1,17 @@
-import Tkinter as tk
-
+import bisect
 import random
 import numpy as np
 import sys
+import time
 
 from linalgebra import *
-from simulator import *
+from spatial import Grid, KDTree, ObstacleIndex, PackedObstacleIndex, near_any, overlaps, swept_bounds
+from poses import PoseCache
+from treestore import TreeStore
+from intervals import BlockedIntervals
+from goaltree import GoalTree
+from stats import Stats, timed
+import collision
 
 class RRT(object):
 
@@ -31,24 +37,111 @@ class RRT(object):
 	# how many seconds to display as a forwards choice on the slider
 	forward = 5
 
+	# give each new branch its length as it is added, instead of walking the tree with create_lengths
+	incremental_lengths = True
+
+	# only check new connections, and those an obstacle could have moved onto or off of, for validity
+	# instead of re-checking the whole tree with validity
+	incremental_validity = True
+
+	# width in pixels of the grid cells nodes are bucketed into to find those near each other, for rewiring
+	grid_size = 50
+
+	# check connections against obstacles in batches with NumPy (see collision.py) instead of one side at a time
+	vectorized_collisions = True
+
+	# how many obstacle poses to remember, shared with the simulator for drawing
+	pose_cache_size = 4096
+
+	# with at least this many obstacles, only check connections against the obstacles near them
+	# (see spatial.ObstacleIndex); below it, checking against every side at once is quicker
+	broad_phase_min = 8
+
+	# width in pixels of the grid cells obstacles are bucketed into for the broad phase,
+	# and how many seconds of their movement each bucketing covers
+	obstacle_grid_size = 100
+	obstacle_window = 2.0
+
+	# also require each connection on a path to the goal to stay clear of the obstacles the whole time
+	# the robot travels along it, rather than only at the time the slider is at
+	swept_paths = False
+
+	# work out when each connection is blocked when it is created (see intervals.py), so validity at any time
+	# is a binary search and the slider can be moved back and forth cheaply
+	# the obstacles are sampled every interval_step seconds, which can miss blocks shorter than that
+	interval_validity = False
+	interval_step = 0.05
+	interval_tolerance = 1e-3
+
+	# how the tree grows each time step:
+	# 'goal' rolls for a branch off of every node, in a random direction weighted towards the goal
+	# 'nearest' samples a place and time, and steers the nearest node in space-time towards it
+	extension = 'goal'
+
+	# for 'nearest': how many samples to take each time step, and how often to sample the goal itself
+	samples_per_step = 4
+	goal_bias = 0.2
+
+	# RRT*-style rewiring: each new node is reconnected through whichever node within rewire_radius pixels
+	# gets it there soonest, and the nodes around it are reconnected through it where that is sooner
+	# a new connection must be clear now, and for the whole time the robot travels along it
+	rewiring = False
+	rewire_radius = 60.0
+
+	# also grow a tree backwards from the goal each time step (see goaltree.py), and join new nodes to it
+	# where the way on to the goal is valid and stays clear of the obstacles while the robot travels it
+	# join_tries is how many of the nodes near each new goal tree node to try joining it to
+	bidirectional = False
+	join_tries = 3
+
+	# how many of the valid nodes nearest a new goal branch towards it each step, until it is reached
+	# as branch_creation leaves a tree which has already grown large hardly growing at all, see retarget
+	retarget_branches = 4
+
+	# the most nodes to keep in the tree, None for no limit
+	# past it, prune drops the subtrees which are no use any more, then the leaves farthest from the goal,
+	# until the tree is down to prune_to of the budget
+	node_budget = None
+	prune_to = .75
+
 	def __init__(self, root):
 		self.size = 7
 		self.speed = 20
 		self.base = Vector((200, 180))
-		self.first_node = None
+		self.first_node = None # the row of the first node in the tree store
+		self.last_node = None # the row of the node added last
 		self.goal = Vector((300, 350))
 
 		self.sim = None
 		self.root = root
 
-		self.rrt_index = 0
+		self.rrt_index = 0 # the number of nodes added so far, which names the next one
 
-		self.data = {}
-		self.connects = {}
-		self.name_to_node = {} # converts a name to a node
+		# the whole tree, by row: nodes are known by their row, and connections by the row of the node
+		# they lead to, see treestore.py
+		self.store = TreeStore()
 
 		self.found_goal = False
 
+		self.valid_t = None # the time the connections were last checked against obstacles
+
+		self.poses = PoseCache(RRT.pose_cache_size)
+		self.sides = None # the sides of the obstacles at sides_t, for the collision checks
+		self.sides_t = None
+		self.obstacle_index = None
+		self.intervals = None
+		self.node_index = None # nodes by where and when they're reached, for 'nearest' extension
+		self.node_grid = None # nodes by where they are, for rewiring
+		self.goal_nodes = [] # the nodes within success_radius of the goal
+		self.goal_tree = None # grown back from the goal, for bidirectional
+		self.retargeted = False # whether the goal moved and hasn't been reached since
+		self.prunes = 0 # how many subtrees have been dropped, so whatever draws them knows to look
+		self.stats = None # where planning spends its time, while profiling (see profile)
+		self.trace = None # records what planning does, while recording (see traces.py)
+
+		self.width = 400 # the area the tree can grow in
+		self.height = 400
+
 		self.top_time = 0
 
 		# probability of creating a new branch off of an existing one, checked each loop cycle
@@ -58,101 +151,183 @@ class RRT(object):
 		str_list = []
 		str_list.append("RRT: [")
 
-		for key, values in self.data.items():
-			str_list.append(str(key) + " ")
-			for value in values:
-				str_list.append(str(value) + " ")
+		for node in self.nodes_in_order():
+			str_list.append(self.node_str(node) + " ")
+			for child in self.store.children(node):
+				str_list.append(self.connection_str(child) + " ")
 
 		str_list.append("]")
 		return ''.join(str_list)
 
+	# describes the node in row as [name: valid arrival (x, y)]
+	def node_str(self, row):
+		store = self.store
+		return ("[" + str(store.name[row]) + ": " + str(bool(store.valid[row])) + " " +
+			str(store.arrival(row)) + " " + str(store.loc(row)) + "]")
+
+	# describes the connection with the given edge id
+	def connection_str(self, edge):
+		return ("Connect: [" + str(bool(self.store.valid[edge])) + " (" +
+			self.node_str(self.store.parent[edge]) + " to " + self.node_str(edge) + ") ]")
+
+	# starts counting and timing the planner's work, and the simulator's if there is one, see stats.py
+	# returns the Stats, which are also kept as self.stats until profiling is stopped
+	def profile(self, enabled=True):
+		self.stats = Stats() if enabled else None
+		self.poses.stats = self.stats
+		if self.intervals is not None:
+			self.intervals.stats = self.stats
+		return self.stats
+
+	# returns a copy of the profiling stats so far, or None if not profiling
+	def stats_snapshot(self):
+		return self.stats.snapshot() if self.stats else None
+
 	def create_rrt(self):
 		# need a second node to be able to run validity
-		first_node = self.add_node(self.base, [], 0)
+		first_node = self.add_node(self.base, 0)
 		self.first_node = first_node
-		self.add_branch(0, 0)
-
+		if self.trace:
+			self.trace.node(first_node, None)
+		self.add_branch(first_node, 0)
+
+	# moves the goal, keeping the tree grown so far
+	# where the nodes are, when they're reached and whether they're valid don't depend on the goal, so only
+	# which nodes are near enough to it has to be worked out again, from the tree store
+	# returns the path to the new goal, as update would, if the tree already gets there
+	# otherwise, with 'goal' extension, the valid nodes nearest the goal branch off towards it each step
+	def retarget(self, goal, t):
+		self.goal = goal
+		self.found_goal = False
+		self.goal_tree = None
+		if self.trace:
+			self.trace.goal(goal[0], goal[1])
+
+		to_goal = self.store_dist_to_goal()
+		near = (to_goal <= self.success_radius) & self.store.live[:len(to_goal)]
+		self.goal_nodes = np.flatnonzero(near).tolist()
+
+		for node in sorted(self.goal_nodes, key=self.store.arrival):
+			visited = self.find_goal_path(node, [])
+			if visited:
+				self.retargeted = False
+				return visited
+
+		self.retargeted = True
+		return None
+
+	# returns the valid nodes nearest the goal, up to count of them, nearest first
+	def nearest_to_goal(self, count):
+		to_goal = self.store_dist_to_goal()
+		valid = np.flatnonzero(self.store.valid[:len(to_goal)] & self.store.live[:len(to_goal)])
+		return valid[np.argsort(to_goal[valid], kind='mergesort')[:count]].tolist()
+
+	@timed('update')
 	def update(self, t):
-		base = self.name_to_node.get(0)
-
 		visited = None
 
-		if self.sim and base:
+		if self.sim and self.first_node is not None:
+			if self.trace:
+				self.trace.step(t)
+
 			if t > self.top_time:
 				self.top_time = t
 				visited = self.add_branches(t)
+				if self.node_budget is not None and len(self.store) > self.node_budget:
+					self.prune(t)
 				if visited:
 					return visited
+			else:
+				self.rewind(t)
 
 			self.sim.display_sim(t)
 
 		return visited
 
-	# creates a node which is at the given x, y; connected to connections; and has a name
-	def add_node(self, loc, connection_nodes, t):
-		new_node = Node(self.rrt_index, loc, t)
-
-		# loop over names of connections and create a new one
-
-		connections = []
-		for connection_node in connection_nodes:
-			other_connect = self.connect_name(connection_node, new_node)
-			if not other_connect in self.connects:
-				connections.append(self.add_connect(new_node, connection_node, t))
-		self.data[new_node] = connections
-
-		self.name_to_node[self.rrt_index] = new_node
+	# brings validity back to an earlier time t, which is only a lookup per connection with interval_validity
+	# without it, the tree is left as it was at the latest time
+	def rewind(self, t):
+		if self.interval_validity:
+			if self.incremental_validity:
+				self.advance_validity(t)
+			else:
+				self.validity(self.first_node, t)
+
+	# creates a node which is at the given x, y, connected from the trunk node if given, and has a name
+	# returns its row
+	def add_node(self, loc, t, trunk=-1):
+		new_node = self.store.add(loc[0], loc[1], t, self.rrt_index, trunk)
+		if self.stats:
+			self.stats.add('nodes_added')
 
 		self.rrt_index += 1
+		self.last_node = new_node
 
 		return new_node
 
-	def add_connect(self, start, end, t):
-		new_connect = Connection(start, end, t)
-		
-		new_connect_name = self.connect_name(start, end)
-		self.connects[new_connect_name] = new_connect
-		return new_connect
-
-	# loops over all connections to a node and marks how long they are
+	# loops over all connections from a node and marks how long they are
+	@timed('lengths')
 	def create_lengths(self, node, length_before, visited):
+		store = self.store
 		visited.append(node)
-		for connection in self.data[node]:
-			next_node = connection.end
+		for next_node in store.children(node):
 			if not next_node in visited:
-				length = (node.loc.subtract(next_node.loc).len() / RRT.traversal_rate
-					if (node and next_node) else 0) # distance between node and next_node
+				length = distance(store.loc(node), store.loc(next_node)) / RRT.traversal_rate # distance between node and next_node
 				length_before += length
-				if connection.len is 0:
-					connection.len = length_before
-				if next_node.len is 0:
-					next_node.len = length_before
+				if store.len[next_node] == 0:
+					store.len[next_node] = length_before
 				self.create_lengths(next_node, length_before, visited)
 
-	def node_name(self, node):
-		return str(node.name) if node else "None"
+	# gives the connection leading to node, and so the node, the length create_lengths would, in O(1)
+	# create_lengths carries a running length across each node's connections in the order they
+	# were added, so the trunk keeps that running total for its next branch
+	@timed('lengths')
+	def set_length(self, node):
+		store = self.store
+		trunk = store.parent[node]
 
-	def connect_name(self, start, end):
-		return self.node_name(start) + ":" + self.node_name(end)
+		length = store.branch_from(trunk) + distance(store.loc(trunk), store.loc(node)) / RRT.traversal_rate
+		store.branch_len[trunk] = length
+
+		if store.len[node] == 0:
+			store.len[node] = length
 
 	# creates a series of random branches off of each existing node
+	@timed('branches')
 	def add_branches(self, t):
-		visited = None
-		for key in self.data.keys():
-			add_branch = random.random() <= self.update_branch_creation()
-			if add_branch:
-				new_visited = self.add_branch(key.name, t)
-				if new_visited:
-					visited = new_visited
+		first_new = self.rrt_index
+
+		if self.extension == 'nearest':
+			visited = self.add_nearest_branches(t)
+		else:
+			visited = None
+			if self.retargeted:
+				for node in self.nearest_to_goal(RRT.retarget_branches):
+					new_visited = self.add_branch(node, t)
+					if new_visited:
+						visited = new_visited
+
+			for node in self.nodes_in_order():
+				add_branch = random.random() <= self.update_branch_creation()
+				if add_branch:
+					new_visited = self.add_branch(node, t)
+					if new_visited:
+						visited = new_visited
+
+		if self.bidirectional and not visited:
+			visited = self.join_trees(first_new, self.grow_goal_tree(t), t)
+		if visited:
+			self.retargeted = False
 		return visited
 
-	# creates a branch in a random direction with given name off of given trunk
-	def add_branch(self, trunk_name, t):
-		trunk = self.name_to_node[trunk_name]
+	# creates a branch in a random direction off of the trunk node
+	@timed('branches')
+	def add_branch(self, trunk, t):
+		trunk_loc = self.store.loc(trunk)
 
 		# find angle between the trunk node and the goal node
-		del_x = self.goal[0] - trunk[0]
-		del_y = self.goal[1] - trunk[1]
+		del_x = self.goal[0] - trunk_loc[0]
+		del_y = self.goal[1] - trunk_loc[1]
 		goal_a = math.atan(del_y/del_x)
 		# random number between [0, 2 pi), measured counterlockwise from the horizontal
 		# rand_a = ((random.random() - random.random() # random number in [-1, 1], weighted towards 0
@@ -165,32 +340,56 @@ class RRT(object):
 		# 		+ (goal_a - math.pi) # weighted to goal_a
 		# 		) % 2*math.pi
 		rand_a = np.random.normal(goal_a, .2) % 2.0*math.pi
+		if self.trace:
+			self.trace.angle(trunk, rand_a)
 
 		del_h = self.dist_to_goal(trunk)
 
 		while True:
 			rand_dist = random.random() * self.branch_len_max + self.branch_len_min
+			if self.trace:
+				self.trace.distance(rand_dist)
 			# rand_dist = random.random() * (del_h + 30) + (del_h - 30)
 
 			rand_x = math.cos(rand_a) * rand_dist
 			rand_y = math.sin(rand_a) * rand_dist
-			rand_loc = Vector((rand_x, rand_y)).add(trunk.loc)
-			if rand_loc[0] > 0 and rand_loc[0] < 400 and rand_loc[1] > 0 and rand_loc[1] < 400:
+			rand_loc = Vector2(rand_x, rand_y).add(trunk_loc)
+			if rand_loc[0] > 0 and rand_loc[0] < self.width and rand_loc[1] > 0 and rand_loc[1] < self.height:
 				# within the canvas
 				break
 
 			rand_a += math.pi/10
 
-		new_branch = self.add_node(rand_loc, [], t)
+		return self.grow(trunk, rand_loc, t)
+
+	# adds a new node at loc, connected from the trunk node, at time t
+	# returns the path to the goal if the new node reached it
+	def grow(self, trunk, loc, t):
+		new_branch = self.add_node(loc, t, trunk)
+		if self.trace:
+			self.trace.node(new_branch, trunk)
 
 		dist_to_goal = self.dist_to_goal(new_branch)
 
-		new_connect = self.add_connect(trunk, new_branch, t)
-		self.data[trunk].append(new_connect)
-		self.create_lengths(self.first_node, 0, [])
-		self.validity(self.add_connect(None, self.first_node, 0), t)
+		if self.incremental_lengths:
+			self.set_length(new_branch)
+		else:
+			self.create_lengths(self.first_node, 0, [])
+		if self.interval_validity:
+			self.fill_intervals(new_branch, t + RRT.forward)
+		if self.incremental_validity:
+			self.add_validity(new_branch, t)
+		else:
+			self.validity(self.first_node, t)
+		if self.node_index is not None:
+			self.node_index.insert(self.space_time(new_branch), new_branch)
+		if self.node_grid is not None:
+			self.node_grid.insert(new_branch, self.node_bounds(new_branch))
+		if self.rewiring:
+			self.rewire(new_branch, t)
 
 		if dist_to_goal <= self.success_radius:
+			self.goal_nodes.append(new_branch)
 			visited = self.find_goal_path(new_branch, [])
 			# if visited:
 			# 	print "testing at", t
@@ -199,66 +398,627 @@ class RRT(object):
 
 			return visited
 
-	# finds a path from to_find to the goal
+	# grows the tree by steering the nearest nodes towards random places and times
+	def add_nearest_branches(self, t):
+		visited = None
+		for i in range(RRT.samples_per_step):
+			new_visited = self.add_nearest_branch(t)
+			if new_visited:
+				visited = new_visited
+		return visited
+
+	# samples a place (sometimes the goal) and a time in the next forward seconds, finds the node
+	# nearest to it in space-time, and grows a branch from that node towards the place
+	@timed('branches')
+	def add_nearest_branch(self, t):
+		if random.random() < RRT.goal_bias:
+			target = (self.goal[0], self.goal[1])
+		else:
+			target = (random.random() * self.width, random.random() * self.height)
+		target_t = t + random.random() * RRT.forward
+		if self.trace:
+			self.trace.target(target[0], target[1], target_t)
+
+		trunk, dist = self.nearest_index().nearest(
+			(target[0], target[1], target_t * RRT.traversal_rate))
+		trunk_loc = self.store.loc(trunk)
+
+		# step towards the target, at most as far as the longest branch
+		del_x = target[0] - trunk_loc[0]
+		del_y = target[1] - trunk_loc[1]
+		del_h = math.sqrt(del_x**2.0 + del_y**2.0)
+		if del_h < 1:
+			return None
+
+		step = min(del_h, self.branch_len_max) / del_h
+		return self.grow(trunk, Vector2(trunk_loc[0] + del_x * step, trunk_loc[1] + del_y * step), t)
+
+	# grows the goal tree by samples_per_step branches, each from its node nearest a random place
+	# (sometimes the base) towards it, kept if no obstacle blocks it at time t
+	# branches off the goal itself stay well within success_radius, so a way to the goal through the tree
+	# always reaches it at a node, rather than needing a node right on the goal
+	# returns the new goal tree nodes
+	@timed('goal_tree')
+	def grow_goal_tree(self, t):
+		if self.goal_tree is None or self.goal_tree.root.loc != (self.goal[0], self.goal[1]):
+			self.goal_tree = GoalTree(self.goal)
+
+		added = []
+		for i in range(RRT.samples_per_step):
+			if random.random() < RRT.goal_bias:
+				target = (self.base[0], self.base[1])
+			else:
+				target = (random.random() * self.width, random.random() * self.height)
+			near, dist = self.goal_tree.nearest(target)
+
+			del_x = target[0] - near[0]
+			del_y = target[1] - near[1]
+			del_h = math.sqrt(del_x**2.0 + del_y**2.0)
+			if del_h < 1:
+				continue
+
+			longest = self.success_radius / 2.0 if near is self.goal_tree.root else self.branch_len_max
+			step = min(del_h, longest) / del_h
+			loc = (near[0] + del_x * step, near[1] + del_y * step)
+			if self.segments_hit(np.array([near.loc]), np.array([loc]), t)[0]:
+				continue
+			added.append(self.goal_tree.add(loc, near, near.to_goal + distance(near.loc, loc) / RRT.traversal_rate))
+		return added
+
+	# tries joining the nodes added since the one named first_new to the goal tree nodes nearest them,
+	# then the new goal tree nodes to the nodes nearest them which get there soonest,
+	# returns the path to the goal once joined
+	@timed('goal_tree')
+	def join_trees(self, first_new, new_goal_nodes, t):
+		store = self.store
+		reach = self.branch_len_max**2.0
+		for node in store.rows_in_order(first_new).tolist():
+			goal_node, dist = self.goal_tree.nearest(store.loc(node))
+			if dist <= reach:
+				visited = self.join(node, goal_node, t)
+				if visited:
+					return visited
+
+		for goal_node in new_goal_nodes:
+			near = [node for node in self.near_nodes(goal_node.loc, self.branch_len_max) if store.valid[node]]
+			near.sort(key=lambda node: store.arrival(node) + distance(store.loc(node), goal_node.loc) / RRT.traversal_rate)
+			for node in near[:RRT.join_tries]:
+				visited = self.join(node, goal_node, t)
+				if visited:
+					return visited
+		return None
+
+	# grows the goal tree's way from goal_node to the goal onto node, if the connections would all be
+	# unblocked at time t and stay clear of the obstacles while the robot travels them,
+	# returns the path to the goal as grow does, or None if they wouldn't
+	def join(self, node, goal_node, t):
+		store = self.store
+		if not store.valid[node] or goal_node is self.goal_tree.root:
+			return None
+
+		# the robot has reached the goal at the first node within success_radius, as in grow
+		way = [store.loc(node)]
+		for loc in self.goal_tree.way_to_goal(goal_node):
+			way.append(loc)
+			if distance(loc, self.goal) <= self.success_radius:
+				break
+
+		# the connections all at time t first, as that rules out most ways much more cheaply
+		starts = np.array([(loc[0], loc[1]) for loc in way[:-1]], dtype=float)
+		ends = np.array([(loc[0], loc[1]) for loc in way[1:]], dtype=float)
+		if self.segments_hit(starts, ends, t).any():
+			return None
+
+		# the times are those the connections will be given when they're grown, see set_length
+		length = store.branch_from(node)
+		t_start = store.arrival(node)
+		for i in range(1, len(way)):
+			length += distance(way[i - 1], way[i]) / RRT.traversal_rate
+			t_end = t + length
+			if self.segment_contact(way[i - 1], way[i], t_start, t_end) is not None:
+				return None
+			t_start = t_end
+
+		trunk = node
+		for loc in way[1:]:
+			visited = self.grow(trunk, Vector2(loc[0], loc[1]), t)
+			if visited:
+				return visited
+			trunk = self.last_node
+		return None
+
+	# returns the rows of the nodes in the order they were added
+	# anything which draws random numbers or changes the tree node by node goes through them in this order,
+	# as rows are reused once pruned, so the same run can hand out rows in a different order
+	def nodes_in_order(self):
+		return self.store.rows_in_order().tolist()
+
+	# returns the node index, building it from the existing nodes the first time
+	def nearest_index(self):
+		if self.node_index is None:
+			self.node_index = KDTree(3)
+			for node in self.nodes_in_order():
+				self.node_index.insert(self.space_time(node), node)
+		return self.node_index
+
+	# returns where and when the node is reached, with time scaled into pixels by traversal_rate
+	def space_time(self, node):
+		x, y = self.store.loc(node)
+		return (x, y, self.store.arrival(node) * RRT.traversal_rate)
+
+	# finds a path from to_find to the goal, as the edge ids of the connections along it
+	@timed('goal_path')
 	def find_goal_path(self, to_find, visited):
+		for edge in self.path_to_root(to_find):
+			if not self.store.valid[edge]: # the connection to the node isn't valid
+				return None
+			if self.swept_paths and self.first_contact(edge) is not None:
+				return None
+			visited.append(edge)
 
-		if to_find is self.first_node:
-			# visited.append(self.first_node)
-			return visited
+		return visited
 
-		for node, connections in self.data.items():
-			# find a node which connects to to_find
-			for connection in connections:
-				if to_find is connection.end:
-					if not connection.valid: # the connection to the node isn't valid
-						return None
-					visited.append(connection)
-					# then look for a node which connects to that one
-					return self.find_goal_path(node, visited)
+	# returns the path to the goal which gets there soonest, as find_goal_path would give it,
+	# out of those which are valid and stay clear of the obstacles the whole way; None if there are none
+	def best_goal_path(self):
+		for node in sorted(self.goal_nodes, key=self.store.arrival):
+			path = self.path_to_root(node)
+			for edge in path:
+				if not self.store.valid[edge] or self.first_contact(edge) is not None:
+					break
+			else:
+				return path
+		return None
+
+	# returns the edge ids of the connections leading from node back to the first node, following each
+	# node's parent; as each connection shares its row with the node it leads to, these are also the rows
+	# of the nodes along the path, from node back to the one after the first node
+	def path_to_root(self, node):
+		parent = self.store.parent
+		path = []
+		while parent[node] >= 0:
+			path.append(node)
+			node = int(parent[node])
+		return path
+
+	# reconnects node through whichever nearby node gets it there soonest, then reconnects each nearby node
+	# through node where that is sooner, returns True if anything was reconnected
+	# the nodes which are reconnected, and everything after them, get there sooner
+	# the tree has to be up to date with time t, as it is after grow
+	@timed('rewiring')
+	def rewire(self, node, t):
+		near = self.near_nodes(self.store.loc(node), RRT.rewire_radius)
+		changed = self.improve_parent(node, near, t)
+		for other in near:
+			if self.improve_parent(other, [node], t):
+				changed = True
+		return changed
+
+	# rewires around every node at time t, until the wall clock reaches stop if given
+	# returns True if any node was made sooner
+	def rewire_all(self, t, stop=None):
+		if self.trace:
+			self.trace.rewire_all(t)
+		if self.incremental_validity:
+			self.advance_validity(t)
+
+		changed = False
+		for node in self.nodes_in_order():
+			if stop is not None and time.time() >= stop:
+				break
+			if self.rewire(node, t):
+				changed = True
+		return changed
+
+	# reconnects node through whichever of the candidates gets it there soonest, if any is sooner than now
+	# a candidate has to be valid and created no later than node, so it's always reached first,
+	# and the connection from it has to be clear at t and while the robot travels along it
+	def improve_parent(self, node, candidates, t):
+		store = self.store
+		parent = store.parent[node]
+		if parent < 0:
+			return False
+
+		options = []
+		for other in candidates:
+			if other == node or other == parent or not store.valid[other] or store.t[other] > store.t[node]:
+				continue
+			length = self.rewired_length(other, node)
+			if length < store.len[node]:
+				options.append((length, other))
+
+		for length, other in sorted(options, key=lambda option: option[0]):
+			start = store.loc(other)
+			end = store.loc(node)
+			if self.segment_blocked(start, end, t):
+				continue
+			if self.segment_contact(start, end, store.arrival(other), float(store.t[node]) + length) is not None:
+				continue
+			self.reparent(node, other, t)
+			return True
+		return False
+
+	# returns the length node would have if it were connected from start
+	# that is the length set_length would give it, carrying on from start's last branch, so that it can
+	# be compared with the length node got when it was grown
+	def rewired_length(self, start, node):
+		store = self.store
+		return store.branch_from(start) + distance(store.loc(start), store.loc(node)) / RRT.traversal_rate
+
+	# connects node from start in place of its parent, with the length rewired_length gives it,
+	# and moves node and everything after it to arrive sooner by the same amount
+	def reparent(self, node, start, t):
+		store = self.store
+		if self.trace:
+			self.trace.rewire(node, start)
+
+		length = self.rewired_length(start, node)
+		store.unlink(node)
+		store.link(node, start)
+		# as set_length does, so the next branch off the start carries on from this one
+		store.branch_len[start] = length
+
+		sooner = store.len[node] - length
+		moved = store.subtree(node)
+		store.len[moved] -= sooner
+		store.len[node] = length
+		store.branch_len[moved] -= sooner
+		if self.node_index is not None:
+			# they are reached sooner, so they move in the index too
+			for row in moved:
+				self.node_index.insert(self.space_time(row), row)
+
+		if self.interval_validity:
+			self.blocked_intervals().forget(node)
+			self.fill_intervals(node, t + RRT.forward)
+		store.blocked[node] = self.blocked_edges([node], t)[0]
+		self.spread_validity([node])
+
+	# returns the nodes within radius of loc in the order they were added, building the node grid the first time
+	def near_nodes(self, loc, radius):
+		if self.node_grid is None:
+			self.node_grid = Grid(RRT.grid_size)
+			for node in self.nodes_in_order():
+				self.node_grid.insert(node, self.node_bounds(node))
+
+		store = self.store
+		bounds = (loc[0] - radius, loc[1] - radius, loc[0] + radius, loc[1] + radius)
+		near = [node for node in self.node_grid.query(bounds) if distance(store.loc(node), loc) <= radius]
+		return sorted(near, key=lambda node: store.name[node])
+
+	# the bounding box of a node, which is only a point
+	def node_bounds(self, node):
+		x, y = self.store.loc(node)
+		return (x, y, x, y)
+
+	# drops the subtrees which are no use any more: those after a node which is invalid at t and which the
+	# robot would already have reached, and, with interval_validity, those after a connection which is
+	# blocked for the next window, from t for at least forward seconds (see blocked_from)
+	# that isn't the same as blocked for good, as the obstacles go on moving after the window
+	# then, while there are more than prune_to of node_budget nodes, drops the leaves farthest from the goal
+	# the first node, and the nodes leading to those near the goal, are always kept
+	# returns how many nodes were dropped
+	@timed('pruning')
+	def prune(self, t):
+		store = self.store
+		n = store.count
+		keep = self.prune_protected()
+		before = len(store)
+
+		live = store.live[:n]
+		roots = live & ~store.valid[:n] & (store.arrivals() <= t)
+		if self.interval_validity:
+			for row in np.flatnonzero(live & store.blocked[:n]).tolist():
+				roots[row] |= self.blocked_from(row, t)
+		for row in np.flatnonzero(roots & ~keep).tolist():
+			# unless it was after another one dropped already
+			if store.live[row]:
+				self.remove_subtree(row)
+
+		target = int(self.node_budget * RRT.prune_to) if self.node_budget is not None else before
+		while len(store) > target:
+			parent = store.parent[:n]
+			children = np.bincount(parent[parent >= 0], minlength=n)
+			leaves = np.flatnonzero(store.live[:n] & (children == 0) & ~keep)
+			if not len(leaves):
+				break
+			farthest = np.argsort(-self.store_dist_to_goal()[leaves], kind='mergesort')
+			for row in leaves[farthest[:len(store) - target]].tolist():
+				self.remove_subtree(row)
+
+		return before - len(store)
+
+	# returns whether each node has to be kept when pruning: the first node, and those leading to the goal
+	def prune_protected(self):
+		parent = self.store.parent
+		keep = np.zeros(self.store.count, dtype=bool)
+		keep[self.first_node] = True
+		for node in self.goal_nodes:
+			while not keep[node]:
+				keep[node] = True
+				node = parent[node]
+		return keep
+
+	# returns True if the edge is blocked for the next window: from t until as far ahead as its
+	# blocks are worked out, which is at least forward seconds
+	def blocked_from(self, edge, t):
+		self.fill_intervals(edge, t + RRT.forward)
+		times = self.blocked_intervals().times[edge]
+		switch = bisect.bisect_right(times, t)
+		return switch % 2 == 1 and switch == len(times)
+
+	# takes node and everything after it out of the tree, and out of everything which finds nodes in it
+	def remove_subtree(self, node):
+		if self.trace:
+			self.trace.prune(node)
+
+		for removed in self.store.remove(node):
+			if self.node_grid is not None:
+				self.node_grid.remove(removed)
+			if self.node_index is not None:
+				self.node_index.remove(removed)
+			if self.intervals is not None:
+				self.intervals.forget(removed)
+			if self.stats:
+				self.stats.add('nodes_pruned')
+
+		self.goal_nodes = [goal_node for goal_node in self.goal_nodes if self.store.live[goal_node]]
+		self.prunes += 1
 
 	# the distance between the goal and the node
 	def dist_to_goal(self, node):
-		return node.loc.subtract(self.goal).len()
-
-	# check validity of node paths, moves downards through connections to in_connect.end
-	def validity(self, in_connect, t):
-		for connection in self.data[in_connect.end]:
-			connection.valid = True
-			connection.end.valid = True
-			if self.intersects_obs(connection, t):
-				connection.valid = False
+		return distance(self.store.loc(node), self.goal)
+
+	# the distance between the goal and each node, by row
+	def store_dist_to_goal(self):
+		return np.sqrt(((self.store.locations() - (self.goal[0], self.goal[1]))**2.0).sum(axis=1))
+
+	# check validity of node paths, moves downards through the connections after node
+	@timed('validity')
+	def validity(self, node, t):
+		# the whole tree can be done at once with the tree store's arrays
+		if self.vectorized_collisions and node == self.first_node:
+			self.tree_validity(t)
+			return
+
+		store = self.store
+		for next_node in store.children(node):
+			store.blocked[next_node] = self.intersects_obs(store.loc(node), store.loc(next_node), t)
+			if self.stats:
+				self.stats.add('edges_checked')
 			# if this node isn't valid, nothing it connects to is
-			# ignore the way you came from
-			if (((not connection.valid) or (not in_connect.valid)) and 
-				in_connect.end is not connection.end):
-				connection.valid = False
-				connection.end.valid = False
-			if in_connect.end is not connection.end:
-				self.validity(connection, t)
-
-	# Returns true if the connection intersects any obstacle
-	def intersects_obs(self, connection, t):
+			store.valid[next_node] = store.valid[node] and not store.blocked[next_node]
+			self.validity(next_node, t)
+
+	# validity for the whole tree at time t, checking every connection in one go and spreading
+	# the results with the tree store's arrays
+	@timed('validity')
+	def tree_validity(self, t):
+		store = self.store
+		ids, starts, ends = store.edges()
+		if self.stats:
+			self.stats.add('edges_checked', len(ids))
+
+		store.blocked[ids] = self.edges_blocked(ids, starts, ends, t)
+		store.spread_validity()
+
+	# returns whether each of the edges is blocked at time t
+	def blocked_edges(self, ids, t):
+		starts, ends = self.store.segments(ids)
+		return self.edges_blocked(ids, starts, ends, t)
+
+	# returns whether each of the edges, as given by TreeStore.edges, is blocked at time t
+	@timed('collisions')
+	def edges_blocked(self, ids, starts, ends, t):
+		if self.interval_validity:
+			intervals = self.blocked_intervals()
+			return np.array([intervals.blocked(edge, start, end, t) for edge, start, end
+				in zip(np.asarray(ids).tolist(), starts.tolist(), ends.tolist())], dtype=bool)
+		if self.vectorized_collisions:
+			return self.segments_hit(starts, ends, t)
+		return np.array([self.intersects_obs(start, end, t)
+			for start, end in zip(starts.tolist(), ends.tolist())], dtype=bool)
+
+	# returns whether the segment from start to end, which isn't a connection in the tree, is blocked at time t
+	def segment_blocked(self, start, end, t):
+		if self.interval_validity:
+			return self.blocked_intervals().segment_blocked(start, end, t)
+		return self.intersects_obs(start, end, t)
+
+	# checks each of the edges against the obstacles at time t, marking whether they are blocked
+	# returns the edges which this changed
+	def check_edges(self, ids, t):
+		ids = np.asarray(ids, dtype=np.intp)
+		if not len(ids):
+			return []
+
+		hits = self.blocked_edges(ids, t)
+		if self.stats:
+			self.stats.add('edges_checked', len(ids))
+
+		changed = ids[hits != self.store.blocked[ids]]
+		self.store.blocked[ids] = hits
+		return changed.tolist()
+
+	# the incremental version of validity: brings the tree up to time t, then checks only the new connection
+	@timed('validity')
+	def add_validity(self, edge, t):
+		self.advance_validity(t)
+
+		self.check_edges([edge], t)
+		self.spread_validity([edge])
+
+	# re-checks the connections which an obstacle could have moved onto or off of since
+	# validity was last found, then spreads any changes down the tree
+	@timed('validity')
+	def advance_validity(self, t):
+		if self.valid_t is not None and t != self.valid_t:
+			changed = self.check_edges(self.moved_past(self.valid_t, t), t)
+			self.spread_validity(changed)
+
+		self.valid_t = t
+
+	# returns the edge ids of the connections near anywhere a moving obstacle went between t_start and t_end
+	# every connection's box is tested against every moving obstacle's at once (see spatial.near_any),
+	# as there may be far more obstacles than connections, or far more connections than obstacles
+	def moved_past(self, t_start, t_end):
+		obstacles = self.sim.obstacles
+		ids, starts, ends = self.store.edges()
+		boxes = np.column_stack((np.minimum(starts, ends), np.maximum(starts, ends)))
+		if hasattr(obstacles, 'moving'):
+			swept = obstacles.bounds(t_start, t_end)[obstacles.moving()]
+		else:
+			swept = np.array([bounds for obstacle, bounds in zip(obstacles, swept_bounds(obstacles, t_start, t_end))
+				if obstacle.moving()], dtype=float).reshape(-1, 4)
+		return ids[near_any(boxes, swept)]
+
+	# a connection is valid if the node it starts from is valid and no obstacle blocks it,
+	# and the node it leads to is valid if the connection is
+	# pushes changes down the tree only as far as they make a difference
+	@timed('validity')
+	def spread_validity(self, edges):
+		store = self.store
+		to_check = list(edges)
+		while to_check:
+			edge = to_check.pop()
+			valid = bool(store.valid[store.parent[edge]]) and not store.blocked[edge]
+			if valid == store.valid[edge]:
+				continue
+
+			store.valid[edge] = valid
+			to_check.extend(store.children(edge))
+
+	# Returns true if the segment from start to end intersects any obstacle
+	@timed('collisions')
+	def intersects_obs(self, start, end, t):
+		if self.vectorized_collisions:
+			return bool(self.segments_hit(np.array([start], dtype=float), np.array([end], dtype=float), t)[0])
+
 		for obstacle in self.sim.obstacles:
-			if self.intersects_ob(connection, obstacle, t):
+			if self.intersects_ob(start, end, obstacle, t):
 				return True
 		return False
 
-	# Checks each side of the obstacle and see if it intersects the connection
+	# works out when the connection leading to node is blocked up to time t, see intervals.py
+	def fill_intervals(self, node, t):
+		store = self.store
+		self.blocked_intervals().fill(node, store.loc(store.parent[node]), store.loc(node), t)
+
+	# returns the blocked intervals for the obstacles, see intervals.py
+	def blocked_intervals(self):
+		if self.intervals is None or self.intervals.obstacles is not self.sim.obstacles:
+			self.intervals = BlockedIntervals(self.sim.obstacles, RRT.interval_step, RRT.interval_tolerance)
+			self.intervals.stats = self.stats
+		return self.intervals
+
+	# returns the first time the robot touches an obstacle while travelling along the connection,
+	# or None if it never does
+	# the robot leaves the start of the connection when it arrives there, and reaches the end at its arrival time
+	@timed('collisions')
+	def first_contact(self, edge):
+		store = self.store
+		start = store.parent[edge]
+		return self.segment_contact(store.loc(start), store.loc(edge), store.arrival(start), store.arrival(edge))
+
+	# returns the first time the robot touches an obstacle while travelling from start, leaving at t_start,
+	# to end, arriving at t_end, or None if it never does
+	def segment_contact(self, start, end, t_start, t_end):
+		bounds = (min(start[0], end[0]), min(start[1], end[1]), max(start[0], end[0]), max(start[1], end[1]))
+
+		obstacles = self.sim.obstacles
+		if hasattr(obstacles, 'vertices_of'):
+			# only the Shapes whose boxes overlap are built
+			boxes = obstacles.bounds(t_start, t_end)
+			near = ((boxes[:, 0] <= bounds[2]) & (bounds[0] <= boxes[:, 2]) &
+				(boxes[:, 1] <= bounds[3]) & (bounds[1] <= boxes[:, 3]))
+			obstacles = [obstacles[i] for i in np.flatnonzero(near).tolist()]
+
+		first = None
+		for obstacle in obstacles:
+			if not overlaps(obstacle.bounds(t_start, t_end), bounds):
+				continue
+			contact = collision.first_contact(start, end, t_start, t_end, obstacle)
+			if contact is not None and (first is None or contact < first):
+				first = contact
+		return first
+
+
+	# returns an array which is True where each segment, given as (n, 2) start and end arrays,
+	# intersects any obstacle at time t
+	@timed('collisions')
+	def segments_hit(self, starts, ends, t):
+		obstacles = self.sim.obstacles
+		if hasattr(obstacles, 'vertices_of'):
+			return self.packed_segments_hit(starts, ends, t)
+		if len(obstacles) < self.broad_phase_min:
+			side_starts, side_ends, owners = self.obstacle_sides(t)
+			if self.stats:
+				self.stats.add('side_tests', len(starts) * len(side_starts))
+			return collision.segments_hit(starts, ends, side_starts, side_ends)
+
+		if self.obstacle_index is None or self.obstacle_index.obstacles is not obstacles:
+			self.obstacle_index = ObstacleIndex(obstacles, RRT.obstacle_grid_size, RRT.obstacle_window)
+
+		# only the segments near each obstacle are checked against its sides
+		hit = np.zeros(len(starts), dtype=bool)
+		for i, near in self.obstacle_index.candidates(starts, ends, t).items():
+			vertices = self.poses.vertices(obstacles[i], t)
+			near = np.array(near)
+			if self.stats:
+				self.stats.add('side_tests', len(near) * len(vertices))
+			hit[near] |= collision.segments_hit(starts[near], ends[near], vertices, np.roll(vertices, -1, axis=0))
+		return hit
+
+	# segments_hit for a ShapeSet: the obstacles near each segment, and their vertices, are found with array
+	# passes over all of them at once, without building a Shape for any of them
+	def packed_segments_hit(self, starts, ends, t):
+		obstacles = self.sim.obstacles
+		if self.obstacle_index is None or self.obstacle_index.obstacles is not obstacles:
+			self.obstacle_index = PackedObstacleIndex(obstacles, RRT.obstacle_grid_size, RRT.obstacle_window)
+
+		hit = np.zeros(len(starts), dtype=bool)
+		segments, near = self.obstacle_index.pairs(starts, ends, t)
+		if not len(segments):
+			return hit
+
+		used, near = np.unique(near, return_inverse=True)
+		vertices, offsets = obstacles.vertices_of(used, t)
+		# the vertex after each one, looping back to the first of its obstacle
+		after = np.arange(len(vertices)) + 1
+		after[offsets[1:] - 1] = offsets[:-1]
+
+		if self.stats:
+			self.stats.add('side_tests', int(np.diff(offsets)[near].sum()))
+		crossed = collision.pairs_hit(starts[segments], ends[segments], near, offsets, vertices, vertices[after])
+		hit[segments[crossed]] = True
+		return hit
+
+	# returns the sides of every obstacle at time t, see collision.polygon_sides
+	def obstacle_sides(self, t):
+		if self.sides is None or self.sides_t != t:
+			self.sides = collision.polygon_sides(
+				[self.poses.vertices(obstacle, t) for obstacle in self.sim.obstacles])
+			self.sides_t = t
+		return self.sides
+
+
+	# Checks each side of the obstacle and see if it intersects the segment from start to end
 	# see https://www.cdn.geeksforgeeks.org/check-if-two-given-line-segments-intersect/
-	def intersects_ob(self, connection, obstacle, t):
+	def intersects_ob(self, start, end, obstacle, t):
 		# allows the last vertex to loop back to the first one
-		vertices = list(obstacle.absolute_pos(t).points)
+		vertices = list(self.poses.absolute_pos(obstacle, t).points)
 		vertices.append(vertices[0])
+		if self.stats:
+			self.stats.add('side_tests', len(vertices) - 1)
 
 		for i in range(0, len(vertices) - 1):
-			side = Connection(vertices[i], vertices[i+1], 0)
-			side_1 = side.get_rotate(connection[0])
-			side_2 = side.get_rotate(connection[1])
+			side_1 = rotates(vertices[i], vertices[i+1], start)
+			side_2 = rotates(vertices[i], vertices[i+1], end)
 
-			connect_1 = connection.get_rotate(side[0])
-			connect_2 = connection.get_rotate(side[1])
+			connect_1 = rotates(start, end, vertices[i])
+			connect_2 = rotates(start, end, vertices[i+1])
 
-			# if both sets go different directions, then the side intersects the connection
+			# if both sets go different directions, then the side intersects the segment
 			if (side_1 is not side_2) and (connect_1 is not connect_2):
 				return True
 
@@ -268,58 +1028,23 @@ class RRT(object):
 	# see https://www.desmos.com/calculator/2iovtlu2fn for average nodes created each loop cycle
 	# both are based on the number of existing nodes
 	def update_branch_creation(self):
-		self.branch_creation = 1 - math.tanh(len(self.data)/RRT.branch_weight)
+		self.branch_creation = 1 - math.tanh(len(self.store)/RRT.branch_weight)
 		return self.branch_creation
 
 
-# represents a single node in the rrt
-class Node(object):
-	def __init__(self, name, loc, t):
-		self.name = name
-		self.size = 7
-		self.loc = loc
-		self.t = t
-		self.len = 0
-
-		self.valid = True
-
-	def __getitem__(self, index):
-		return self.loc[index]
-
-	def __str__(self):
-		return ("[" + str(self.name) + ": " + str(self.valid) + " " + str(self.t + self.len) + " " + str(self.loc) +  "]")
-
-# connects two nodes
-class Connection(object):
-
-	def __init__(self, start, end, t):
-		self.start = start
-		self.end = end
-		self.t = t
-		self.len = 0
-
-		self.valid = True
-		# self.valid = end.name is not 1
-
-	def __str__(self):
-		return ("Connect: [" + str(self.valid) + " (" + 
-			str(self.start) + " to " + str(self.end) + ") ]")
-
-	def __getitem__(self, index):
-		if index is 0:
-			return self.start
-		elif index is 1:
-			return self.end
-
-	# returns the direction the connection rotates relative to the input vector
-	# see https://www.geeksforgeeks.org/orientation-3-ordered-points/
-	# returns True --> clockwise; False --> counterclockwise
-	def get_rotate(self, vector):
-		direction = ((self.end[1] - self.start[1]) * (vector[0] - self.end[0]) -
-			(self.end[0] - self.start[0]) * (vector[1] - self.end[1]))
-		return direction > 0
+# returns the direction the segment from start to end rotates relative to the input vector
+# see https://www.geeksforgeeks.org/orientation-3-ordered-points/
+# returns True --> clockwise; False --> counterclockwise
+def rotates(start, end, vector):
+	direction = ((end[1] - start[1]) * (vector[0] - end[0]) -
+		(end[0] - start[0]) * (vector[1] - end[1]))
+	return direction > 0
 
 def main():
+	# the GUI is only needed when running the simulator, planning works without it
+	import Tkinter as tk
+	from simulator import Simulator
+	import scenarios
 
 	null = Vector((0, 0, 0))
 
@@ -333,9 +1058,6 @@ def main():
 		),
 		Vector((100, 100, 0)), Vector((30, -30, 0)))
 
-	line = Connection(Vector((200, 180)), Vector((160.308, 314.109)), 0)
-	# side = Connection(Vector((0, 0)), Vector((100, 0)), 0)
-
 	ob2 = Shape((
 		Vector((0, -40)), 
 		Vector((40, 0)), 
@@ -353,15 +1075,24 @@ def main():
 		Vector((300, 300, 0)), Vector((6, 0, math.pi/10)))
 
 	obstacles = (ob1, ob2, ob3)
+	scenario = scenarios.Scenario(obstacles, Vector((200, 180)), Vector((300, 350)))
+
+	# or the scenario file given, see scenarios.py
+	# --background grows the tree on a thread of its own, see worker.py
+	args = [arg for arg in sys.argv[1:] if arg != '--background']
+	if args:
+		scenario = scenarios.load(args[0])
 
 	root = tk.Tk()
 	rrt = RRT(root)
-	sim = Simulator(root, obstacles, rrt)
+	rrt.base = scenario.base
+	rrt.goal = scenario.goal
+	rrt.width = scenario.width
+	rrt.height = scenario.height
+	sim = Simulator(root, scenario.obstacles, rrt, scenario.width, scenario.height,
+		background='--background' in sys.argv)
 	rrt.sim = sim
 
-	# print rrt.intersects_obs(line)
-
-	# print side.get_rotate(Vector((120, 20)))
 	# sim.canvas.create_line(100, 100, 190, 110)
 
 	root.mainloop()
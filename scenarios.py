@@ -0,0 +1,125 @@
+import json
+import mmap
+import struct
+
+import numpy as np
+
+from linalgebra import *
+
+# Scenarios are the obstacles, base, goal and canvas size to plan in, saved in one of two forms:
+#
+# JSON, for small scenes written by hand:
+#   {"width": 400, "height": 400, "base": [200, 180], "goal": [300, 350],
+#    "obstacles": [{"points": [[0, -40], [40, 0], [0, 40], [-40, 0]],
+#                   "t0": [200, 240, 0], "velocity": [0, 10, -1.047]}]}
+# with points relative to the obstacle's center, and t0 and velocity as (x, y, angle).
+#
+# Packed binary, for large scenes: a header, then the arrays of a ShapeSet one after another,
+# little-endian and 8 byte aligned:
+#   offsets  int64   (shapes + 1,)   where each obstacle's points start, and the end of the last one
+#   points   float64 (points, 3)     every obstacle's points relative to its center, the third always 0
+#   t0       float64 (shapes, 3)
+#   velocity float64 (shapes, 3)
+# The file is memory mapped and the arrays are used where they lie, so no Python objects are made
+# for obstacles until the planner looks at them.
+
+magic = b'RRTS'
+version = 1
+
+# magic, version, number of obstacles, number of points, width, height, base x, y, goal x, y
+header = struct.Struct('<4sHxxQQII4d')
+
+class Scenario(object):
+	def __init__(self, obstacles, base, goal, width=400, height=400):
+		self.obstacles = obstacles # a tuple of Shapes, or a ShapeSet
+		self.base = base
+		self.goal = goal
+		self.width = width
+		self.height = height
+
+	# returns a Planner for the scenario, see planner.py
+	def planner(self, max_time=30, seed=None):
+		from planner import Planner
+		return Planner(self.obstacles, self.base, self.goal, max_time, seed=seed,
+			width=self.width, height=self.height)
+
+# loads a scenario saved in either form
+def load(path):
+	with open(path, 'rb') as scenario:
+		packed = scenario.read(len(magic)) == magic
+	return load_binary(path) if packed else load_json(path)
+
+# saves the scenario as JSON if path ends in .json, otherwise packed
+def save(scenario, path):
+	if path.endswith('.json'):
+		save_json(scenario, path)
+	else:
+		save_binary(scenario, path)
+
+def load_json(path):
+	with open(path) as scenario:
+		values = json.load(scenario)
+
+	obstacles = []
+	for obstacle in values['obstacles']:
+		points = tuple(Vector2(x, y) for x, y in obstacle['points'])
+		obstacles.append(Shape(points, Vector3(*obstacle['t0']), Vector3(*obstacle['velocity'])))
+
+	return Scenario(tuple(obstacles), Vector2(*values['base']), Vector2(*values['goal']),
+		values.get('width', 400), values.get('height', 400))
+
+def save_json(scenario, path):
+	obstacles = []
+	for obstacle in scenario.obstacles:
+		obstacles.append({
+			'points': [[point[0], point[1]] for point in obstacle.points],
+			't0': [obstacle.t0[i] for i in range(3)],
+			'velocity': [obstacle.velocity[i] for i in range(3)],
+			})
+
+	with open(path, 'w') as out:
+		json.dump({
+			'width': scenario.width,
+			'height': scenario.height,
+			'base': [scenario.base[0], scenario.base[1]],
+			'goal': [scenario.goal[0], scenario.goal[1]],
+			'obstacles': obstacles,
+			}, out, indent=1)
+
+# loads a packed scenario, with its obstacles as a ShapeSet over the memory mapped file
+def load_binary(path):
+	with open(path, 'rb') as scenario:
+		data = mmap.mmap(scenario.fileno(), 0, access=mmap.ACCESS_READ)
+
+	values = header.unpack_from(data, 0)
+	if values[0] != magic:
+		raise ValueError(path + " is not a packed scenario")
+	if values[1] != version:
+		raise ValueError(path + " is scenario version " + str(values[1]) + ", not " + str(version))
+	shapes, points = values[2], values[3]
+
+	# each array starts where the one before it ends, and the arrays keep the map open
+	offset = header.size
+	arrays = []
+	for dtype, count in ((np.int64, shapes + 1), (np.float64, points * 3),
+			(np.float64, shapes * 3), (np.float64, shapes * 3)):
+		arrays.append(np.frombuffer(data, dtype=np.dtype(dtype).newbyteorder('<'), count=count, offset=offset))
+		offset += count * 8
+	offsets, local, t0, velocity = arrays
+
+	obstacles = ShapeSet(local.reshape(points, 3), offsets, t0.reshape(shapes, 3), velocity.reshape(shapes, 3))
+	return Scenario(obstacles, Vector2(values[6], values[7]), Vector2(values[8], values[9]), values[4], values[5])
+
+def save_binary(scenario, path):
+	obstacles = scenario.obstacles
+	if not isinstance(obstacles, ShapeSet):
+		obstacles = shape_set(obstacles)
+
+	with open(path, 'wb') as out:
+		out.write(header.pack(magic, version, len(obstacles), len(obstacles.points),
+			int(scenario.width), int(scenario.height), scenario.base[0], scenario.base[1],
+			scenario.goal[0], scenario.goal[1]))
+		out.write(np.ascontiguousarray(obstacles.offsets, dtype='<i8').tobytes())
+		out.write(np.ascontiguousarray(obstacles.points, dtype='<f8').tobytes())
+		out.write(np.ascontiguousarray(obstacles.t0, dtype='<f8').tobytes())
+		out.write(np.ascontiguousarray(obstacles.velocity, dtype='<f8').tobytes())
@@ -2,29 +2,56 @@ import Tkinter as tk
 
 import math
 
-from linalgebra import *
+import numpy as np
 
+from linalgebra import *
+from poses import PoseCache
+from stats import timed
+from worker import PlanningThread, Snapshot
+
+# background, if set, grows the tree on a thread of its own (see worker.py) rather than in the slider's
+# callback, so the slider only chooses the time to show, and the tree is drawn from the latest snapshot
+# of it every poll_interval milliseconds
+# without it, the tree is drawn from a snapshot taken each time it is displayed, in the same way
 class Simulator(object):
-	def __init__(self, root, obstacles, rrt):
+
+	poll_interval = 30
+	horizon = 120 # how far ahead in time the thread grows the tree looking for the goal
+
+	def __init__(self, root, obstacles, rrt, width=400, height=400, background=False):
 		self.canvas = None
 		self.root = root
 
-		self.canvas_width = 400
-		self.canvas_height = 400
+		self.canvas_width = width
+		self.canvas_height = height
 
 		self.obstacles = obstacles
 		self.rrt = rrt
+		self.poses = rrt.poses
+
+		self.background = background
+		self.worker = None # the thread growing the tree, while there is one
+		self.snapshot = None # the snapshot being shown
+		self.rows = None # how each node looked when the snapshot was last drawn, see draw_snapshot
+		self.goal = None # where the goal was last put, as (x, y)
 
+		# each thing on the canvas keeps the same items for as long as it is drawn
+		# the tree's are kept by row, see treestore.py
 		self.obstacle_pointers = {}
 		self.centroid_pointers = {}
 		self.rrt_node_pointers = {}
 		self.rrt_connection_pointers = {}
 		self.rrt_label_pointers = {}
 		self.timestamp_pointer = None
+		self.base_pointer = None
+		self.goal_pointer = None
+		self.goal_label_pointer = None
+
+		self.drawn = {} # item -> the options, coords and whether it's hidden, as last given to Tk
+		self.restack = False # whether hidden items need lowering beneath the rest again
 
 		self.finish_time = -1
-		self.visited = []
-		self.visited_nodes = []
+		self.visited = [] # the rows of the nodes along the path to the goal, see RRT.find_goal_path
 		self.to_end = None
 
 		self.start_draw()
@@ -41,9 +68,38 @@ class Simulator(object):
 
 		self.canvas.bind("<Button-1>", self.set_goal)
 
+	# the first click starts the tree, later ones move the goal and carry on with it
 	def set_goal(self, event):
-		self.rrt.goal = Vector((event.x, event.y))
-		self.start_prog()
+		goal = Vector((event.x, event.y))
+		self.goal = (goal[0], goal[1])
+		if self.rrt.first_node is None:
+			self.rrt.goal = goal
+			self.start_prog()
+		else:
+			self.replan(goal)
+
+	# moves the goal without starting the tree again, see RRT.retarget
+	def replan(self, goal):
+		curr_t = self.time.get()
+		self.finish_time = -1
+		self.visited = []
+		self.draw_goal()
+
+		if self.worker:
+			self.worker.retarget(goal)
+			self.time.configure(activebackground='orchid3', troughcolor='orchid1')
+			# redrawn straight away, without the old path
+			self.snapshot = None
+			self.poll_snapshot()
+			return
+
+		visited = self.rrt.retarget(goal, curr_t)
+		if visited:
+			self.found(visited)
+		else:
+			self.time.configure(to=max(curr_t, self.rrt.top_time) + self.rrt.forward,
+				activebackground='orchid3', troughcolor='orchid1')
+		self.display_sim(curr_t)
 
 	def start_prog(self, event=None):
 		visited = self.rrt.create_rrt()
@@ -54,20 +110,80 @@ class Simulator(object):
 
 		time = tk.Scale(from_=0, to=self.rrt.max_time, length=(self.canvas_height - 25), resolution=.1, 
 			activebackground='orchid3', troughcolor='orchid1', state=tk.DISABLED,
-			command=self.update)
+			command=self.show if self.background else self.update)
 		time.pack(side='right')
 		self.time = time
 		self.time.config(state="normal")
 
+		if self.background:
+			self.start_worker()
+
+	# hands the tree over to a planning thread, and starts polling it for snapshots
+	def start_worker(self):
+		# the thread keeps the rrt's pose cache to itself
+		self.poses = PoseCache(self.rrt.poses.size)
+		self.worker = PlanningThread(self.rrt, self.obstacles, max_time=Simulator.horizon)
+		self.worker.start()
+		self.root.after(Simulator.poll_interval, self.poll)
+
 	def stop_prog(self, event=None):
+		if self.worker:
+			self.worker.stop()
 		self.root.quit()
 
+	# the simulator is profiled along with the rrt, see RRT.profile
+	# but not while a planning thread is using the rrt's stats, as they only time one thread
+	@property
+	def stats(self):
+		return None if self.worker else self.rrt.stats
+
+	# picks up the planning thread's latest snapshot every poll_interval, until the thread fails
+	def poll(self):
+		if self.poll_snapshot():
+			self.root.after(Simulator.poll_interval, self.poll)
+
+	# shows the planning thread's latest snapshot, if it has a new one
+	# returns False if the thread stopped with an error, after printing it and turning the slider red
+	# the last snapshot stays up, so the tree it got to can still be looked over
+	def poll_snapshot(self):
+		snapshot = self.worker.snapshot
+		if snapshot is not self.snapshot:
+			self.snapshot = snapshot
+
+			if self.finish_time is -1:
+				# the thread may not have moved to a new goal yet
+				if snapshot.found() and snapshot.goal == self.goal:
+					self.show_finish(snapshot.finish_time + .1)
+				else:
+					self.time.configure(to=max(snapshot.t, self.rrt.forward))
+			self.show()
+
+		if self.worker.error is not None:
+			print "planning stopped at time", snapshot.t
+			print self.worker.error
+			self.time.configure(activebackground='red3', troughcolor='salmon')
+			return False
+		return True
+
+	# shows the tree at the slider's time, while it grows in the background
+	def show(self, event=None):
+		if self.snapshot:
+			self.display_sim(self.time.get())
+
+	@timed('drawing')
 	def display_sim(self, t, event=None):
-		self.draw_rrt(t)
+		if not self.worker:
+			self.snapshot = Snapshot(self.rrt, self.rrt.top_time, self.visited)
+		self.draw_snapshot(t)
 		self.draw_obstacles(t)
 		self.draw_base()
 		self.draw_timestamp(t)
 
+		# hidden items are whited out, so they go beneath everything else
+		if self.restack:
+			self.canvas.tag_lower('hidden')
+			self.restack = False
+
 		# self.root.after(int(self.rrt.time_step * 1000), self.display_sim, t + self.rrt.time_step)
 
 	# updates the rrt, generating more nodes
@@ -77,146 +193,173 @@ class Simulator(object):
 		self.rrt.branch_weight = 5 + curr_t
 		# found a goal node
 		if visited and self.finish_time is -1:
-			max_time = (visited[0].end.t + visited[0].end.len + .1)
-
-			for item in visited:
-				self.visited_nodes.append(item.end)
-				print "visited", item.end
-
-			print "time: ", max_time
-
-			self.finish_time = max_time
-			self.visited = visited
-			self.time.configure(to=max_time, activebackground='green3', troughcolor='OliveDrab2')
+			self.found(visited)
 		# haven't found the goal yet, keep generating more time
 		elif self.finish_time is -1:
 			self.time.configure(to=curr_t + self.rrt.forward)
 
+	# shows the path to the goal, and stops the slider at the time it gets there
+	def found(self, visited):
+		max_time = (self.rrt.store.arrival(visited[0]) + .1)
+
+		for item in visited:
+			print "visited", self.rrt.node_str(item)
+
+		print "time: ", max_time
+
+		self.visited = visited
+		self.show_finish(max_time)
+
+	# stops the slider at the time the path gets to the goal
+	def show_finish(self, max_time):
+		self.finish_time = max_time
+		self.time.configure(to=max_time, activebackground='green3', troughcolor='OliveDrab2')
+
 	# displays a timestamp in the upper left corner
 	def draw_timestamp(self, t):
 		if not self.timestamp_pointer:
-			self.timestamp_pointer = self.canvas.create_text(30, 10, text="t = " + str(t))
+			self.timestamp_pointer = self.create('text', (30, 10), text="t = " + str(t))
 		else:
-			self.canvas.itemconfig(self.timestamp_pointer, text="t = " + str(t))
+			self.configure(self.timestamp_pointer, text="t = " + str(t))
 
 	# draws a dot for the robot
 	def draw_base(self):
-		self.canvas.create_oval(self.draw_dot((
-			self.rrt.base[0], 
-			self.rrt.base[1]),
-			self.rrt.size), 
-			fill='green')
+		coords = self.draw_dot((self.rrt.base[0], self.rrt.base[1]), self.rrt.size)
+		if not self.base_pointer:
+			self.base_pointer = self.create('oval', coords, fill='green')
+		else:
+			self.move(self.base_pointer, coords)
 
 	# draws a dot for the goal node
 	def draw_goal(self):
-		self.canvas.create_oval(self.draw_dot((
-			self.rrt.goal[0], 
-			self.rrt.goal[1]),
-			self.rrt.size), 
-			fill='dodger blue')
-		self.canvas.create_text(
-			self.rrt.goal[0],
-			self.rrt.goal[1] - 14,
-			fill='black',
-			text='Goal')
-
-	# draws the rrt by looping over each node and each node's connections to other nodes
-	def draw_rrt(self, t):
-		for node, connections in self.rrt.data.items():
-
-			color = 'PaleGreen1' if node.valid else 'salmon'
-
-			# draw the connections too
-			self.draw_connections(t, connections)
-
-			if node and (node.t + node.len) <= t:
-				if not node in self.rrt_node_pointers: # first time
-					self.rrt_node_pointers[node] = self.canvas.create_oval(self.draw_dot((
-						node.loc[0],
-						node.loc[1]),
-						node.size),
-						fill=color)
-					self.rrt_label_pointers[node] = self.canvas.create_text(
-						node.loc[0], 
-						node.loc[1] - 14, 
-						fill='black',
-						text=str(math.ceil((node.t + node.len)*10)/10)) # round to one decimal place
-				else: # all later instances
-					if node in self.visited_nodes:
-						color = 'RoyalBlue1' if self.at_finish_time(t) else color
-					self.canvas.itemconfig(self.rrt_node_pointers[node], fill=color, outline=color)
-					self.canvas.itemconfig(self.rrt_label_pointers[node], fill='black')
-			elif self.rrt_node_pointers.get(node):
-				self.canvas.itemconfig(self.rrt_node_pointers[node], fill='white', outline='white')
-				self.canvas.itemconfig(self.rrt_label_pointers[node], fill='white')
-				self.canvas.tag_lower(self.rrt_label_pointers[node])
-				self.canvas.tag_lower(self.rrt_node_pointers[node])
-
-	# returns True if t is equal to self.finish_time 
-	# (ie: the moment when the path to the goal exists)
-	def at_finish_time(self, t):
-		return abs(t - self.finish_time) < .1
-
-	def draw_connections(self, t, connections):
-		for connection in connections:
-				
-			color = ('PaleGreen1' if connection.valid else 'salmon')
-
-			# description of the connection
-			node = connection.start
-			connect_name = self.rrt.connect_name(connection.start, connection.end)
-			connect_pointer = self.rrt_connection_pointers.get(connect_name)
-
-			if connection and node and (connection.t + connection.len) <= t:
-				if not connect_pointer:
-					# get the actual node, not the name of it
-					other_node = connection.end
-
-					connect_pointer = self.canvas.create_line(
-						node.loc[0],
-						node.loc[1],
-						other_node.loc[0],
-						other_node.loc[1],
-						fill=color,
-						width=4)
-					self.rrt_connection_pointers[connect_name] = connect_pointer
-					self.canvas.tag_lower(connect_pointer)
-				else:
-					if connection in self.visited:
-						color = 'RoyalBlue1' if self.at_finish_time(t) else color
-					self.canvas.itemconfig(connect_pointer, fill=color)
-
-			elif self.rrt_connection_pointers.get(connect_name):
-				self.canvas.itemconfig(connect_pointer, fill='white')
+		goal = self.goal or self.rrt.goal
+		coords = self.draw_dot((goal[0], goal[1]), self.rrt.size)
+		label_coords = (goal[0], goal[1] - 14)
+		if not self.goal_pointer:
+			self.goal_pointer = self.create('oval', coords, fill='dodger blue')
+			self.goal_label_pointer = self.create('text', label_coords, fill='black', text='Goal')
+		else:
+			self.move(self.goal_pointer, coords)
+			self.move(self.goal_label_pointer, label_coords)
+
+	# draws the snapshot of the tree at time t, coloured by whether each node is valid, with the path to the
+	# goal in blue once it gets there
+	# only the nodes which look different since it was last drawn are gone over
+	def draw_snapshot(self, t):
+		snapshot = self.snapshot
+		n = len(snapshot)
+		on_path = snapshot.goal == self.goal and self.at_finish_time(t)
+		rows = {
+			'shown': snapshot.arrivals <= t,
+			'valid': snapshot.valid,
+			'highlight': snapshot.on_path & on_path,
+			'arrivals': snapshot.arrivals,
+			'x': snapshot.locations[:, 0], # rows freed by pruning are used again for new nodes
+			'y': snapshot.locations[:, 1],
+			'parent': snapshot.parent,
+			'live': snapshot.live,
+			}
+
+		changed = np.ones(n, dtype=bool)
+		if self.rows is not None:
+			drawn = min(n, len(self.rows['valid']))
+			changed[:drawn] = False
+			for key, values in rows.items():
+				changed[:drawn] |= values[:drawn] != self.rows[key][:drawn]
+		self.rows = rows
+
+		for row in np.flatnonzero(changed).tolist():
+			self.draw_row(snapshot, row, rows['shown'][row], rows['highlight'][row])
+
+		if on_path and snapshot.path:
+			self.draw_to_end(snapshot.locations[snapshot.path[0]], snapshot.goal)
+		else:
+			self.draw_to_end(None, None)
+
+	# draws the node in row row of a snapshot, and the connection leading to it
+	# rows freed by pruning are used again for new nodes, which take over their items
+	def draw_row(self, snapshot, row, shown, highlight):
+		node_pointer = self.rrt_node_pointers.get(row)
+		label_pointer = self.rrt_label_pointers.get(row)
+		connect_pointer = self.rrt_connection_pointers.get(row)
+		parent = snapshot.parent[row]
+
+		if not snapshot.live[row]:
+			self.forget(row)
+			return
+
+		if not shown:
+			for pointer in (node_pointer, label_pointer, connect_pointer):
+				if pointer:
+					self.configure(pointer, fill='white')
+					self.hide(pointer, True)
+			if node_pointer:
+				self.configure(node_pointer, outline='white')
+			return
+
+		color = 'PaleGreen1' if snapshot.valid[row] else 'salmon'
+		if highlight:
+			color = 'RoyalBlue1'
+		x, y = snapshot.locations[row].tolist()
+		label = str(math.ceil(snapshot.arrivals[row]*10)/10) # round to one decimal place
+
+		if parent >= 0:
+			coords = tuple(snapshot.locations[parent].tolist()) + (x, y)
+			if not connect_pointer:
+				connect_pointer = self.create('line', coords, fill=color, width=4)
+				self.rrt_connection_pointers[row] = connect_pointer
 				self.canvas.tag_lower(connect_pointer)
-
-		if self.at_finish_time(t):
+				self.restack = True
+			else:
+				self.move(connect_pointer, coords)
+				self.configure(connect_pointer, fill=color)
+				self.hide(connect_pointer, False)
+
+		if not node_pointer:
+			self.rrt_node_pointers[row] = self.create('oval', self.draw_dot((x, y), snapshot.size),
+				fill=color, outline=color)
+			self.rrt_label_pointers[row] = self.create('text', (x, y - 14), fill='black', text=label)
+		else:
+			self.move(node_pointer, self.draw_dot((x, y), snapshot.size))
+			self.move(label_pointer, (x, y - 14))
+			self.configure(node_pointer, fill=color, outline=color)
+			self.configure(label_pointer, fill='black', text=label)
+			self.hide(node_pointer, False)
+			self.hide(label_pointer, False)
+
+	# deletes the canvas items of the node in row, once it has been pruned, and of the connection leading to it
+	def forget(self, row):
+		for pointers in (self.rrt_node_pointers, self.rrt_label_pointers, self.rrt_connection_pointers):
+			item = pointers.pop(row, None)
+			if item is not None:
+				self.canvas.delete(item)
+				del self.drawn[item]
+
+	# draws the line from the end of the path to the goal, or hides it if start is None
+	def draw_to_end(self, start, goal):
+		if start is not None:
+			coords = (start[0], start[1], goal[0], goal[1])
 			if self.to_end:
-				self.canvas.itemconfig(self.to_end, fill='RoyalBlue1')
-				self.canvas.tag_raise(self.to_end)
+				self.move(self.to_end, coords)
+				self.configure(self.to_end, fill='RoyalBlue1')
+				if self.hide(self.to_end, False):
+					self.canvas.tag_raise(self.to_end)
 			else:
-				self.to_end = self.canvas.create_line(
-					self.visited_nodes[0].loc[0],
-					self.visited_nodes[0].loc[1],
-					self.rrt.goal[0],
-					self.rrt.goal[1],
-					fill='RoyalBlue1',
-					width=4)
+				self.to_end = self.create('line', coords, fill='RoyalBlue1', width=4)
 				self.canvas.tag_raise(self.to_end)
 		elif self.to_end:
-			self.canvas.itemconfig(self.to_end, fill='white')
-			self.canvas.tag_lower(self.to_end)
+			self.configure(self.to_end, fill='white')
+			self.hide(self.to_end, True)
 
-	# returns the connection which goes end -> start
-	def invert(self, connection):
-		name = self.rrt.connect_name(connection.end, connection.start)
-		return self.rrt.connects[name]
+	# returns True if t is equal to self.finish_time 
+	# (ie: the moment when the path to the goal exists)
+	def at_finish_time(self, t):
+		return abs(t - self.finish_time) < .1
 
 	# loops over the obstacles and draws them in turn at time = t
 	def draw_obstacles(self, t):
 		for obstacle in self.obstacles:
-			a = obstacle.velocity[2]
-			absolute_obs = obstacle.absolute_pos(t)
+			absolute_obs = self.poses.absolute_pos(obstacle, t)
 			absolute_points = []
 
 			for abs_point in absolute_obs.points:
@@ -225,27 +368,66 @@ class Simulator(object):
 				absolute_points.append(abs_point[1])
 
 			if not obstacle.t0 in self.obstacle_pointers:
-				obstacle_pointer = self.canvas.create_polygon(absolute_points, fill='light blue')
+				obstacle_pointer = self.create('polygon', absolute_points, fill='light blue')
 				# use t0 as a key, since we can assume no two shapes start atop each other
 				self.obstacle_pointers[obstacle.t0] = obstacle_pointer
 				self.canvas.tag_raise(obstacle_pointer)
 			else:
 				# modify the existing obstacle
-				obstacle_pointer = self.obstacle_pointers.get(obstacle.t0)
-				self.canvas.coords(obstacle_pointer, tuple(absolute_points))
+				self.move(self.obstacle_pointers[obstacle.t0], absolute_points)
 
+			# draw a dot at the centroid of the shape
+			# need to add to the t0 point to get the absolute location
+			absolute_centroid = self.draw_dot(obstacle.centroid(t).add(obstacle.t0), 3)
 			if not obstacle.t0 in self.centroid_pointers:
-				# draw a dot at the centroid of the shape
-				# need to add to the t0 point to get the absolute location
-				absolute_centroid = self.draw_dot(obstacle.centroid(t).add(obstacle.t0), 3)
-				self.centroid_pointers[obstacle.t0] = self.canvas.create_oval(absolute_centroid, 
+				self.centroid_pointers[obstacle.t0] = self.create('oval', absolute_centroid,
 					fill="steel blue", outline="")
 			else:
-				centroid_pointer = self.centroid_pointers.get(obstacle.t0)
-				absolute_centroid = self.draw_dot(obstacle.centroid(t).add(obstacle.t0), 3)
-				self.canvas.coords(centroid_pointer, absolute_centroid)
+				self.move(self.centroid_pointers[obstacle.t0], absolute_centroid)
 
 	# there is no built-in method for drawing a dot, so this implements one
 	# returns the coordinates for a dot
 	def draw_dot(self, coords, size):
-		return (coords[0] - size, coords[1] - size, coords[0] + size, coords[1] + size)
\ No newline at end of file
+		return (coords[0] - size, coords[1] - size, coords[0] + size, coords[1] + size)
+
+	# creates a canvas item of the given kind ('oval', 'line', 'text' or 'polygon'),
+	# remembering how it was drawn
+	def create(self, kind, coords, **options):
+		coords = tuple(coords)
+		item = getattr(self.canvas, 'create_' + kind)(*coords, **options)
+		self.drawn[item] = dict(options, coords=coords)
+		return item
+
+	# sets options on a canvas item, only passing Tk those which differ from what it was last given
+	def configure(self, item, **options):
+		drawn = self.drawn[item]
+		changed = {}
+		for key, value in options.items():
+			if drawn.get(key) != value:
+				changed[key] = value
+		if changed:
+			self.canvas.itemconfig(item, **changed)
+			drawn.update(changed)
+
+	# moves a canvas item, unless it's already there
+	def move(self, item, coords):
+		coords = tuple(coords)
+		drawn = self.drawn[item]
+		if drawn['coords'] != coords:
+			self.canvas.coords(item, coords)
+			drawn['coords'] = coords
+
+	# tags an item as hidden (or not), so it's lowered beneath the rest at the end of the frame
+	# returns True if this changed it
+	def hide(self, item, hidden):
+		drawn = self.drawn[item]
+		if drawn.get('hidden', False) is hidden:
+			return False
+
+		if hidden:
+			self.canvas.addtag_withtag('hidden', item)
+			self.restack = True
+		else:
+			self.canvas.dtag(item, 'hidden')
+		drawn['hidden'] = hidden
+		return True
@@ -0,0 +1,339 @@
+import math
+
+import numpy as np
+
+# bounds are boxes given as (x0, y0, x1, y1), the same as the canvas uses
+
+# returns True if the two boxes touch or overlap
+def overlaps(a, b):
+	return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+# with at most this many pairs of boxes, near_any tests every pair rather than filling a grid
+direct_pairs = 1 << 16
+
+# returns an (n,) array which is True where each of the (n, 4) boxes may overlap any of the (k, 4) others
+# the others are filled into a grid of at most cells by cells over the boxes, then each box adds up the
+# filled cells it covers, so this takes the same few array passes however many boxes overlap
+# it is True for every box which overlaps one of the others, and also for some within a cell of one
+def near_any(boxes, others, cells=512):
+	near = np.zeros(len(boxes), dtype=bool)
+	if not len(boxes) or not len(others):
+		return near
+
+	low = boxes[:, :2].min(axis=0)
+	high = boxes[:, 2:].max(axis=0)
+	others = others[(others[:, 0] <= high[0]) & (low[0] <= others[:, 2]) &
+		(others[:, 1] <= high[1]) & (low[1] <= others[:, 3])]
+	if not len(others):
+		return near
+
+	if len(boxes) * len(others) <= direct_pairs:
+		return ((boxes[:, np.newaxis, 0] <= others[:, 2]) & (others[:, 0] <= boxes[:, np.newaxis, 2]) &
+			(boxes[:, np.newaxis, 1] <= others[:, 3]) & (others[:, 1] <= boxes[:, np.newaxis, 3])).any(axis=1)
+
+	size = max((high - low).max() / cells, 1e-9)
+	shape = np.floor((high - low) / size).astype(np.intp) + 1
+
+	# the (column, row) of the cells at either corner of a box, clipped to the grid
+	def corners(boxes):
+		first = np.clip(np.floor((boxes[:, :2] - low) / size).astype(np.intp), 0, shape - 1)
+		last = np.clip(np.floor((boxes[:, 2:] - low) / size).astype(np.intp), 0, shape - 1)
+		return first, last
+
+	# +1 and -1 at the corners of each of the others, so adding up along both axes fills them in
+	first, last = corners(others)
+	flat = np.concatenate((
+		first[:, 0] * (shape[1] + 1) + first[:, 1],
+		(last[:, 0] + 1) * (shape[1] + 1) + first[:, 1],
+		first[:, 0] * (shape[1] + 1) + last[:, 1] + 1,
+		(last[:, 0] + 1) * (shape[1] + 1) + last[:, 1] + 1))
+	signs = np.repeat([1, -1, -1, 1], len(others))
+	marks = np.bincount(flat, signs, minlength=(shape[0] + 1) * (shape[1] + 1)).reshape(shape + 1)
+	filled = marks.cumsum(axis=0).cumsum(axis=1)[:-1, :-1] > .5
+
+	# the number of filled cells between the first cell and each cell, so any box's is four lookups
+	sums = np.zeros(shape + 1, dtype=np.intp)
+	sums[1:, 1:] = filled.cumsum(axis=0).cumsum(axis=1)
+	first, last = corners(boxes)
+	inside = (sums[last[:, 0] + 1, last[:, 1] + 1] - sums[first[:, 0], last[:, 1] + 1] -
+		sums[last[:, 0] + 1, first[:, 1]] + sums[first[:, 0], first[:, 1]])
+	return inside > 0
+
+# returns the box each obstacle sweeps over between t_start and t_end (see Shape.bounds),
+# working them out all at once for a ShapeSet
+def swept_bounds(obstacles, t_start, t_end):
+	if hasattr(obstacles, 'bounds'):
+		return [tuple(bounds) for bounds in obstacles.bounds(t_start, t_end).tolist()]
+	return [obstacle.bounds(t_start, t_end) for obstacle in obstacles]
+
+# buckets items into the cells of a uniform grid which their bounds cover,
+# so everything near a box can be found without looking at everything else
+class Grid(object):
+
+	def __init__(self, cell_size):
+		self.cell_size = float(cell_size)
+		self.cells = {} # (column, row) -> set of items
+		self.item_cells = {} # item -> the cells it was put in, so it can be taken out again
+
+	def __len__(self):
+		return len(self.item_cells)
+
+	def __contains__(self, item):
+		return item in self.item_cells
+
+	# returns the (column, row) of every cell the bounds cover
+	def cells_for(self, bounds):
+		col_0 = int(math.floor(bounds[0] / self.cell_size))
+		row_0 = int(math.floor(bounds[1] / self.cell_size))
+		col_1 = int(math.floor(bounds[2] / self.cell_size))
+		row_1 = int(math.floor(bounds[3] / self.cell_size))
+
+		keys = []
+		for col in range(col_0, col_1 + 1):
+			for row in range(row_0, row_1 + 1):
+				keys.append((col, row))
+		return keys
+
+	def insert(self, item, bounds):
+		if item in self.item_cells:
+			self.remove(item)
+
+		keys = self.cells_for(bounds)
+		for key in keys:
+			cell = self.cells.get(key)
+			if cell is None:
+				cell = self.cells[key] = set()
+			cell.add(item)
+		self.item_cells[item] = keys
+
+	def remove(self, item):
+		for key in self.item_cells.pop(item, ()):
+			cell = self.cells[key]
+			cell.discard(item)
+			if not cell:
+				del self.cells[key]
+
+	# returns every item sharing a cell with the bounds
+	# these are only candidates, callers still need to check the items themselves
+	def query(self, bounds):
+		found = set()
+		for key in self.cells_for(bounds):
+			cell = self.cells.get(key)
+			if cell:
+				found.update(cell)
+		return found
+
+# a broad phase for moving obstacles: each obstacle is put in a grid by the box it sweeps over a
+# window of time (see Shape.bounds), so only the obstacles near a segment need checking against it
+class ObstacleIndex(object):
+
+	def __init__(self, obstacles, cell_size, window):
+		self.obstacles = obstacles
+		self.grid = Grid(cell_size)
+		self.window = window
+
+		self.bounds = [] # the box each obstacle sweeps between t_start and t_end
+		self.t_start = None
+		self.t_end = None
+
+	# makes sure the boxes cover time t, sweeping them over [t, t + window] if they don't
+	def cover(self, t):
+		if self.t_start is not None and self.t_start <= t <= self.t_end:
+			return
+
+		self.t_start = t
+		self.t_end = t + self.window
+		self.bounds = swept_bounds(self.obstacles, self.t_start, self.t_end)
+		for i, bounds in enumerate(self.bounds):
+			self.grid.insert(i, bounds)
+
+	# returns the indexes of the obstacles whose boxes overlap the bounds at time t
+	def near(self, bounds, t):
+		self.cover(t)
+		return [i for i in self.grid.query(bounds) if overlaps(self.bounds[i], bounds)]
+
+	# pairs up segments with the obstacles near them at time t
+	# starts and ends are (n, 2) arrays, returns {obstacle index: [segment indexes]}
+	def candidates(self, starts, ends, t):
+		self.cover(t)
+		lows = np.minimum(starts, ends).tolist()
+		highs = np.maximum(starts, ends).tolist()
+
+		pairs = {}
+		for i in range(len(lows)):
+			bounds = (lows[i][0], lows[i][1], highs[i][0], highs[i][1])
+			for j in self.grid.query(bounds):
+				if overlaps(self.bounds[j], bounds):
+					pairs.setdefault(j, []).append(i)
+		return pairs
+
+# the ObstacleIndex for a ShapeSet, kept in arrays rather than a Grid: the cells each obstacle's box
+# covers over the window are kept as one sorted array of cell keys, so covering a new window and pairing
+# up segments with obstacles are each a few array passes, however many obstacles there are
+class PackedObstacleIndex(object):
+
+	row_span = 1 << 32 # cell keys are column * row_span + row
+
+	def __init__(self, obstacles, cell_size, window):
+		self.obstacles = obstacles
+		self.cell_size = float(cell_size)
+		self.window = window
+
+		self.bounds = None # the (n, 4) boxes each obstacle sweeps between t_start and t_end
+		self.keys = None # the key of each cell an obstacle covers, once per obstacle, sorted
+		self.owners = None # the obstacle covering each of those
+		self.t_start = None
+		self.t_end = None
+
+	# makes sure the boxes cover time t, sweeping them over [t, t + window] if they don't
+	def cover(self, t):
+		if self.t_start is not None and self.t_start <= t <= self.t_end:
+			return
+
+		self.t_start = t
+		self.t_end = t + self.window
+		self.bounds = self.obstacles.bounds(self.t_start, self.t_end)
+		owners, keys = self.cells(self.bounds)
+		order = np.argsort(keys, kind='mergesort')
+		self.keys = keys[order]
+		self.owners = owners[order]
+
+	# returns (box, key) for every cell each of the (n, 4) boxes covers, as Grid.cells_for
+	def cells(self, boxes):
+		first = np.floor(boxes[:, :2] / self.cell_size).astype(np.int64)
+		last = np.floor(boxes[:, 2:] / self.cell_size).astype(np.int64)
+		rows = last[:, 1] - first[:, 1] + 1
+		counts = (last[:, 0] - first[:, 0] + 1) * rows
+
+		owners = np.repeat(np.arange(len(boxes)), counts)
+		k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+		cols = first[owners, 0] + k // rows[owners]
+		rows = first[owners, 1] + k % rows[owners]
+		return owners, cols * PackedObstacleIndex.row_span + rows
+
+	# pairs up segments with the obstacles near them at time t, as ObstacleIndex.candidates does
+	# starts and ends are (n, 2) arrays, returns (segment indexes, obstacle indexes) with each pair once
+	def pairs(self, starts, ends, t):
+		self.cover(t)
+		boxes = np.column_stack((np.minimum(starts, ends), np.maximum(starts, ends)))
+
+		# every obstacle sharing a cell with each segment
+		segments, keys = self.cells(boxes)
+		first = np.searchsorted(self.keys, keys, 'left')
+		counts = np.searchsorted(self.keys, keys, 'right') - first
+		segments = np.repeat(segments, counts)
+		found = np.repeat(first - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+		obstacles = self.owners[found]
+
+		# of those, the ones whose boxes overlap, as overlaps
+		near = self.bounds[obstacles]
+		box = boxes[segments]
+		overlapping = ((near[:, 0] <= box[:, 2]) & (box[:, 0] <= near[:, 2]) &
+			(near[:, 1] <= box[:, 3]) & (box[:, 1] <= near[:, 3]))
+
+		n = len(self.bounds)
+		pairs = np.unique(segments[overlapping] * n + obstacles[overlapping])
+		return pairs // n, pairs % n
+
+# a node of a KDTree, splitting space along axis at its point
+class KDNode(object):
+	__slots__ = ('point', 'item', 'axis', 'left', 'right')
+
+	def __init__(self, point, item, axis):
+		self.point = point
+		self.item = item
+		self.axis = axis
+		self.left = None # the points below this one along axis
+		self.right = None # the points at or above this one along axis
+
+# a k-d tree of points which can be added to one at a time, for finding the nearest point
+# it isn't rebalanced, which keeps adding cheap; points added in a random order keep it balanced enough
+# removing is lazy: a removed item's node is left in place, empty, until the empty nodes outnumber the
+# rest, then the tree is rebuilt
+class KDTree(object):
+
+	def __init__(self, dims):
+		self.dims = dims
+		self.root = None
+		self.nodes = {} # item -> the KDNode holding it
+		self.empty = 0 # nodes whose item was removed, which nearest skips
+
+	def __len__(self):
+		return len(self.nodes)
+
+	# adds an item at the point, a sequence of dims numbers
+	# an item which is already in the tree is moved to the point
+	def insert(self, point, item):
+		if item in self.nodes:
+			self.remove(item)
+
+		point = tuple(point)
+		if self.root is None:
+			added = self.root = KDNode(point, item, 0)
+		else:
+			node = self.root
+			while True:
+				axis = node.axis
+				if point[axis] < node.point[axis]:
+					if node.left is None:
+						added = node.left = KDNode(point, item, (axis + 1) % self.dims)
+						break
+					node = node.left
+				else:
+					if node.right is None:
+						added = node.right = KDNode(point, item, (axis + 1) % self.dims)
+						break
+					node = node.right
+		self.nodes[item] = added
+
+	def remove(self, item):
+		self.nodes.pop(item).item = None
+		self.empty += 1
+		if self.empty > len(self.nodes):
+			self.rebuild()
+
+	# builds the tree again from the items which haven't been removed
+	def rebuild(self):
+		kept = []
+		to_visit = [self.root] if self.root else []
+		while to_visit:
+			node = to_visit.pop()
+			if node.item is not None:
+				kept.append((node.point, node.item))
+			to_visit.extend(child for child in (node.left, node.right) if child is not None)
+
+		self.root = None
+		self.nodes = {}
+		self.empty = 0
+		for point, item in kept:
+			self.insert(point, item)
+
+	# returns (item, squared distance) for the item nearest the point, or (None, None) if there are none
+	def nearest(self, point):
+		best = None
+		best_dist = None
+
+		# each node to visit comes with how far the point is from its side of the split above it
+		to_visit = [(self.root, 0.0)] if self.root else []
+		while to_visit:
+			node, split_dist = to_visit.pop()
+			if best_dist is not None and split_dist >= best_dist:
+				continue
+
+			if node.item is not None:
+				dist = 0.0
+				for i in range(self.dims):
+					dist += (node.point[i] - point[i])**2.0
+				if best_dist is None or dist < best_dist:
+					best = node.item
+					best_dist = dist
+
+			# look on the point's own side first, and only on the far side if it could be closer
+			gap = point[node.axis] - node.point[node.axis]
+			near, far = (node.left, node.right) if gap < 0 else (node.right, node.left)
+			if far is not None and (best_dist is None or gap**2.0 < best_dist):
+				to_visit.append((far, gap**2.0))
+			if near is not None:
+				to_visit.append((near, 0.0))
+
+		return best, best_dist
@@ -0,0 +1,77 @@
+import functools
+import time
+
+# Counters and timers for finding out where a planning run spends its time.
+# Methods marked with @timed(phase) add their wall time to that phase while their object's stats
+# are set, and do nothing more than check for them while they aren't (see RRT.profile).
+# A phase's time includes the phases it calls into, its self time doesn't, so the self times add up to
+# the total. A phase which calls back into itself, like validity's recursion, is only timed once.
+class Stats(object):
+
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		self.times = {} # phase -> seconds spent in it
+		self.self_times = {} # phase -> seconds spent in it, less the other phases it called
+		self.calls = {} # phase -> times it was entered
+		self.counts = {} # counter -> total
+
+		self.running = [] # [phase, start time, seconds spent in phases it called] for each phase being timed
+
+	# adds amount to the counter
+	def add(self, counter, amount=1):
+		self.counts[counter] = self.counts.get(counter, 0) + amount
+
+	# starts timing phase, returns False if it is already being timed further up
+	def start(self, phase):
+		for running in self.running:
+			if running[0] == phase:
+				return False
+		self.running.append([phase, time.time(), 0.0])
+		return True
+
+	# stops timing the last phase started
+	def stop(self):
+		phase, start, inner = self.running.pop()
+		elapsed = time.time() - start
+
+		self.times[phase] = self.times.get(phase, 0.0) + elapsed
+		self.self_times[phase] = self.self_times.get(phase, 0.0) + elapsed - inner
+		self.calls[phase] = self.calls.get(phase, 0) + 1
+		if self.running:
+			self.running[-1][2] += elapsed
+
+	# returns a copy of the timers and counters so far, which later work doesn't change
+	def snapshot(self):
+		return {
+			'times': dict(self.times),
+			'self_times': dict(self.self_times),
+			'calls': dict(self.calls),
+			'counts': dict(self.counts),
+			}
+
+	def __str__(self):
+		str_list = ["Stats: ["]
+		for phase in sorted(self.self_times, key=self.self_times.get, reverse=True):
+			str_list.append("\n  %-12s %9.4fs self %9.4fs total %8d calls" %
+				(phase, self.self_times[phase], self.times[phase], self.calls[phase]))
+		for counter in sorted(self.counts):
+			str_list.append("\n  %-12s %d" % (counter, self.counts[counter]))
+		str_list.append(" ]")
+		return ''.join(str_list)
+
+# marks a method as part of phase, timing it whenever self.stats is set
+def timed(phase):
+	def wrap(method):
+		@functools.wraps(method)
+		def timed_method(self, *args, **kwargs):
+			stats = self.stats
+			if stats is None or not stats.start(phase):
+				return method(self, *args, **kwargs)
+			try:
+				return method(self, *args, **kwargs)
+			finally:
+				stats.stop()
+		return timed_method
+	return wrap
@@ -0,0 +1,232 @@
+import struct
+
+import numpy as np
+
+from linalgebra import *
+from planner import Scene
+from rrt import RRT
+
+# Records a planning run to a compact binary trace, and replays it headless.
+#
+# A trace starts with a header and the obstacles, then holds one record per event, each a one byte
+# tag followed by its little-endian values:
+#   'S' t                    the planner stepped to time t
+#   'A' trunk, angle         add_branch sampled an angle off of the trunk node
+#   'D' distance             add_branch sampled a distance (several if the first left the canvas)
+#   'P' x, y, t              add_nearest_branch sampled a place and time
+#   'N' trunk, x, y, t       a node was added, connected from trunk (-1 for the first node)
+#   'R' t                    the whole tree was rewired at time t, see RRT.rewire_all
+#   'W' node, parent         a node was reconnected from parent, see RRT.rewire
+#   'G' x, y                 the goal moved, see RRT.retarget
+#   'X' node                 a node and everything after it was pruned, see RRT.prune
+#   'V' row, valid, blocked  the validity of a node, and whether the connection to it was blocked,
+#                            changed during the step before the next 'S'
+# Nodes are given by their rows in the tree store. Replaying grows the same nodes in the same order
+# without drawing any random numbers, and pruned rows are handed out again in the same order, so the
+# rows match the recording's, and a recorded run can be rerun exactly as a fixed workload, with
+# whatever planner settings are current.
+
+magic = b'RRTT'
+version = 2
+
+# header: version, seed (-1 for none), base x, y, goal x, y, width, height, number of obstacles
+header = struct.Struct('<Hq6dI')
+# each obstacle: number of points, t0 x, y, a, velocity x, y, a; followed by its points' x, y
+obstacle_header = struct.Struct('<I6d')
+point = struct.Struct('<2d')
+
+records = {
+	b'S': struct.Struct('<d'),
+	b'A': struct.Struct('<id'),
+	b'D': struct.Struct('<d'),
+	b'P': struct.Struct('<3d'),
+	b'N': struct.Struct('<i3d'),
+	b'R': struct.Struct('<d'),
+	b'W': struct.Struct('<2i'),
+	b'G': struct.Struct('<2d'),
+	b'X': struct.Struct('<i'),
+	b'V': struct.Struct('<i2?'),
+	}
+
+# writes the events of a planning run to out, a file opened for binary writing
+# attach it with record, which makes the rrt call it as it plans
+class TraceWriter(object):
+
+	def __init__(self, out, rrt, seed=None):
+		self.out = out
+		self.rrt = rrt
+
+		# the validity of each row of the tree store when it was last written
+		self.valid = np.zeros(0, dtype=bool)
+		self.blocked = np.zeros(0, dtype=bool)
+
+		obstacles = rrt.sim.obstacles
+		out.write(magic)
+		out.write(header.pack(version, -1 if seed is None else seed, rrt.base[0], rrt.base[1],
+			rrt.goal[0], rrt.goal[1], rrt.width, rrt.height, len(obstacles)))
+		for obstacle in obstacles:
+			out.write(obstacle_header.pack(len(obstacle.points), obstacle.t0[0], obstacle.t0[1], obstacle.t0[2],
+				obstacle.velocity[0], obstacle.velocity[1], obstacle.velocity[2]))
+			for corner in obstacle.points:
+				out.write(point.pack(corner[0], corner[1]))
+
+		# the tree may have been started before recording was
+		for node in rrt.nodes_in_order():
+			parent = int(rrt.store.parent[node])
+			self.node(node, parent if parent >= 0 else None)
+
+	def write(self, tag, *values):
+		self.out.write(tag)
+		self.out.write(records[tag].pack(*values))
+
+	def step(self, t):
+		self.validity()
+		self.write(b'S', t)
+
+	def angle(self, trunk, a):
+		self.write(b'A', trunk, a)
+
+	def distance(self, dist):
+		self.write(b'D', dist)
+
+	def target(self, x, y, t):
+		self.write(b'P', x, y, t)
+
+	def node(self, node, trunk):
+		store = self.rrt.store
+		self.write(b'N', -1 if trunk is None else trunk, store.x[node], store.y[node], store.t[node])
+
+	def rewire_all(self, t):
+		self.write(b'R', t)
+
+	def rewire(self, node, parent):
+		self.write(b'W', node, parent)
+
+	def goal(self, x, y):
+		self.write(b'G', x, y)
+
+	def prune(self, node):
+		self.write(b'X', node)
+
+	# writes the rows of the tree store whose validity changed since it was last written
+	def validity(self):
+		store = self.rrt.store
+		n = store.count
+		valid = store.valid[:n]
+		blocked = store.blocked[:n]
+
+		# new rows start out valid and unblocked
+		known = len(self.valid)
+		was_valid = np.r_[self.valid, np.ones(n - known, dtype=bool)]
+		was_blocked = np.r_[self.blocked, np.zeros(n - known, dtype=bool)]
+		for row in np.flatnonzero((valid != was_valid) | (blocked != was_blocked)):
+			self.write(b'V', int(row), bool(valid[row]), bool(blocked[row]))
+
+		self.valid = valid.copy()
+		self.blocked = blocked.copy()
+
+	# writes the last step's validity and closes the file
+	def close(self):
+		self.validity()
+		self.out.close()
+		if self.rrt.trace is self:
+			self.rrt.trace = None
+
+# starts recording the rrt's planning to the file at path, returns the TraceWriter
+# seed is only kept in the trace, for reference
+def record(rrt, path, seed=None):
+	rrt.trace = TraceWriter(open(path, 'wb'), rrt, seed)
+	return rrt.trace
+
+# a trace read back in
+class Trace(object):
+
+	def __init__(self, path):
+		with open(path, 'rb') as trace:
+			data = trace.read()
+
+		if data[:len(magic)] != magic:
+			raise ValueError(path + " is not a planning trace")
+		offset = len(magic)
+
+		values = header.unpack_from(data, offset)
+		offset += header.size
+		if values[0] != version:
+			raise ValueError(path + " is trace version " + str(values[0]) + ", not " + str(version))
+
+		self.seed = None if values[1] == -1 else values[1]
+		self.base = Vector2(values[2], values[3])
+		self.goal = Vector2(values[4], values[5])
+		self.width = values[6]
+		self.height = values[7]
+
+		obstacles = []
+		for i in range(values[8]):
+			count, x, y, a, v_x, v_y, v_a = obstacle_header.unpack_from(data, offset)
+			offset += obstacle_header.size
+			points = []
+			for j in range(count):
+				points.append(Vector2(*point.unpack_from(data, offset)))
+				offset += point.size
+			obstacles.append(Shape(tuple(points), Vector3(x, y, a), Vector3(v_x, v_y, v_a)))
+		self.obstacles = tuple(obstacles)
+
+		self.data = data
+		self.start = offset
+
+	# yields (tag, values) for each event, in the order they happened
+	def events(self):
+		data = self.data
+		offset = self.start
+		while offset < len(data):
+			tag = data[offset:offset + 1]
+			record = records[tag]
+			yield tag, record.unpack_from(data, offset + 1)
+			offset += 1 + record.size
+
+# rebuilds the recorded tree, growing the same nodes at the same times, with the current RRT settings
+# (though nodes are only reconnected where the trace says, rather than by rewiring again)
+# returns (rrt, mismatches), where mismatches lists (row, valid, blocked) for each recorded validity
+# change the replay doesn't agree with, so an empty list means the replay matched the recording
+def replay(path, check=True):
+	trace = Trace(path)
+
+	rrt = RRT(None)
+	rrt.base = trace.base
+	rrt.goal = trace.goal
+	rrt.width = trace.width
+	rrt.height = trace.height
+	rrt.sim = Scene(trace.obstacles)
+	rrt.rewiring = False
+
+	t = 0
+	mismatches = []
+	for tag, values in trace.events():
+		if tag == b'N':
+			trunk, x, y, t = values
+			if trunk < 0:
+				rrt.first_node = rrt.add_node(Vector2(x, y), t)
+			else:
+				rrt.grow(trunk, Vector2(x, y), t)
+		elif tag == b'S':
+			t = values[0]
+			if t > rrt.top_time:
+				rrt.top_time = t
+			else:
+				rrt.rewind(t)
+		elif tag == b'R':
+			t = values[0]
+			if rrt.incremental_validity:
+				rrt.advance_validity(t)
+		elif tag == b'W':
+			rrt.reparent(values[0], values[1], t)
+		elif tag == b'G':
+			rrt.retarget(Vector2(*values), t)
+		elif tag == b'X':
+			rrt.remove_subtree(values[0])
+		elif tag == b'V' and check:
+			row, valid, blocked = values
+			if bool(rrt.store.valid[row]) is not valid or bool(rrt.store.blocked[row]) is not blocked:
+				mismatches.append(values)
+
+	return rrt, mismatches
@@ -0,0 +1,210 @@
+import math
+
+import numpy as np
+
+# The tree kept in NumPy arrays, one row per node, with no object per node or per connection.
+# A node is known by its row, and every node but the first has exactly one connection leading to it,
+# which shares the row, so a row is also the connection's edge id. Each node's children are kept as a
+# linked list through the child, sibling and last arrays, in the order they were connected.
+# Rows of pruned nodes are reused by the next nodes added, so the arrays only ever hold as many rows
+# as the tree has had nodes at once.
+# Measured on CPython 2.7 a node costs 63 bytes here (up to twice that while the arrays have room to
+# spare), against about 1.3KB for the Node and Connection objects, dicts and connection grid it replaces.
+class TreeStore(object):
+
+	# (name, dtype, value of an empty row)
+	fields = (
+		('x', np.float64, 0.0),
+		('y', np.float64, 0.0),
+		('t', np.float64, 0.0), # the time the node was created
+		('len', np.float64, 0.0), # the time taken to reach the node from the first node
+		('branch_len', np.float64, np.nan), # running length given to the next branch off the node, see RRT.set_length
+		('name', np.int32, -1), # the order the node was added in, which isn't reused
+		('parent', np.int32, -1), # the row of the node the edge comes from, -1 for the first node
+		('child', np.int32, -1), # the row of the node's first child, -1 for none
+		('sibling', np.int32, -1), # the row of the next child of the same parent, -1 for the last one
+		('last', np.int32, -1), # the row of the node's last child, -1 for none
+		('valid', np.bool_, True), # whether the node, and the edge leading to it, can be used
+		('blocked', np.bool_, False), # whether an obstacle covered the edge when it was last checked
+		('live', np.bool_, True), # whether the node is still in the tree, rather than pruned
+		)
+
+	def __init__(self, capacity=64):
+		self.count = 0 # rows in use, and free rows below the last one in use
+		self.capacity = 0
+		self.free = [] # rows below count which aren't in use, to be reused
+		self.reserve(capacity)
+
+	# the number of rows in use
+	def __len__(self):
+		return self.count - len(self.free)
+
+	# makes room for at least capacity rows, doubling the arrays so adding stays cheap
+	def reserve(self, capacity):
+		if capacity <= self.capacity:
+			return
+
+		capacity = max(capacity, 2 * self.capacity)
+		for name, dtype, empty in TreeStore.fields:
+			array = np.full(capacity, empty, dtype=dtype)
+			if self.capacity:
+				array[:self.count] = getattr(self, name)[:self.count]
+			setattr(self, name, array)
+		self.capacity = capacity
+
+	# adds a row for a node at (x, y) created at time t, connected from the parent row if given
+	# returns its row
+	def add(self, x, y, t, name, parent=-1):
+		if self.free:
+			row = self.free.pop()
+		else:
+			row = self.count
+			self.reserve(row + 1)
+			self.count += 1
+
+		self.x[row] = x
+		self.y[row] = y
+		self.t[row] = t
+		self.len[row] = 0.0
+		self.branch_len[row] = np.nan
+		self.name[row] = name
+		self.valid[row] = True
+		self.blocked[row] = False
+		self.live[row] = True
+		if parent >= 0:
+			self.link(row, parent)
+		return row
+
+	# makes row the last child of parent
+	def link(self, row, parent):
+		self.parent[row] = parent
+		self.sibling[row] = -1
+		last = self.last[parent]
+		if last < 0:
+			self.child[parent] = row
+		else:
+			self.sibling[last] = row
+		self.last[parent] = row
+
+	# takes row out of its parent's children
+	def unlink(self, row):
+		parent = self.parent[row]
+		if parent < 0:
+			return
+
+		before = -1
+		child = self.child[parent]
+		while child != row:
+			before = child
+			child = self.sibling[child]
+		if before < 0:
+			self.child[parent] = self.sibling[row]
+		else:
+			self.sibling[before] = self.sibling[row]
+		if self.last[parent] == row:
+			self.last[parent] = before
+		self.parent[row] = -1
+		self.sibling[row] = -1
+
+	# returns the rows of the node's children, in the order they were connected
+	def children(self, row):
+		found = []
+		child = int(self.child[row])
+		while child >= 0:
+			found.append(child)
+			child = int(self.sibling[child])
+		return found
+
+	# returns row and the rows of everything after it in the tree, depth first
+	def subtree(self, row):
+		found = []
+		to_visit = [row]
+		while to_visit:
+			row = to_visit.pop()
+			found.append(row)
+			to_visit.extend(self.children(row))
+		return found
+
+	# takes row and everything after it out of the tree, and keeps their rows to reuse
+	# until then they are left as first nodes with no edge, which the whole-tree passes pass over
+	# returns the rows taken out
+	def remove(self, row):
+		self.unlink(row)
+		removed = self.subtree(row)
+		for name, dtype, empty in TreeStore.fields:
+			getattr(self, name)[removed] = empty
+		self.live[removed] = False
+		self.free.extend(removed)
+		return removed
+
+	# returns the (x, y) of a node
+	def loc(self, row):
+		return (float(self.x[row]), float(self.y[row]))
+
+	# returns the time a node is reached
+	def arrival(self, row):
+		return float(self.t[row] + self.len[row])
+
+	# returns the running length for the next branch off a node, which is its own length until it has one
+	def branch_from(self, row):
+		length = float(self.branch_len[row])
+		return float(self.len[row]) if math.isnan(length) else length
+
+	# returns the rows in use, in the order their nodes were added
+	def rows_in_order(self, first_name=0):
+		rows = np.flatnonzero(self.live[:self.count] & (self.name[:self.count] >= first_name))
+		return rows[np.argsort(self.name[rows], kind='mergesort')]
+
+	# returns the (n, 2) array of node locations
+	def locations(self):
+		return np.column_stack((self.x[:self.count], self.y[:self.count]))
+
+	# returns the time each node is reached
+	def arrivals(self):
+		return self.t[:self.count] + self.len[:self.count]
+
+	# returns (starts, ends) for the edges leading to the given rows, as (n, 2) arrays
+	def segments(self, ids):
+		parents = self.parent[ids]
+		starts = np.column_stack((self.x[parents], self.y[parents]))
+		ends = np.column_stack((self.x[ids], self.y[ids]))
+		return starts, ends
+
+	# returns (edge ids, starts, ends) for every edge, with starts and ends as (n, 2) arrays
+	def edges(self):
+		ids = np.flatnonzero(self.parent[:self.count] >= 0)
+		starts, ends = self.segments(ids)
+		return ids, starts, ends
+
+	# works out valid for every row from blocked: a node is valid if no edge between it and the
+	# first node is blocked
+	def spread_validity(self):
+		n = self.count
+		self.valid[:n] = spread(self.parent[:n], self.blocked[:n])
+
+	# returns the number of bytes used by the arrays
+	def nbytes(self):
+		return sum(getattr(self, name).nbytes for name, dtype, empty in TreeStore.fields)
+
+# returns whether each row is valid, given each row's parent (-1 for the first node) and whether the edge
+# leading to it is blocked
+# each pass doubles how far up the tree every row has looked, so this takes log(depth) passes
+def spread(parent, blocked):
+	n = len(parent)
+	rows = np.arange(n)
+
+	ok = ~blocked
+	above = parent.astype(np.intp)
+	# the first node is always valid, and looks up at itself
+	tops = above < 0
+	ok[tops] = True
+	above[tops] = rows[tops]
+
+	while True:
+		ok &= ok[above]
+		next_above = above[above]
+		if np.array_equal(next_above, above):
+			break
+		above = next_above
+
+	return ok
@@ -0,0 +1,126 @@
+import Queue
+import threading
+import time
+import traceback
+
+import numpy as np
+
+from planner import Scene
+from rrt import RRT
+
+# Grows the tree on a thread of its own, so that drawing it never waits on planning.
+# The thread publishes a Snapshot after every step; whoever draws picks up the latest one whenever
+# it likes (see Simulator.poll), and never touches the RRT itself while the thread is running.
+
+# an unchanging copy of the tree as it was at one time step, which the planner goes on without
+class Snapshot(object):
+
+	def __init__(self, rrt, t, visited=None, finish_time=-1):
+		store = rrt.store
+		n = store.count
+
+		self.t = t # the time the tree had been grown to
+		self.goal = (rrt.goal[0], rrt.goal[1])
+		self.size = rrt.size
+
+		# by row, as in the tree store, and read only
+		self.locations = store.locations()
+		self.arrivals = store.arrivals()
+		self.parent = store.parent[:n].copy()
+		self.valid = store.valid[:n].copy()
+		self.live = store.live[:n].copy() # False for the nodes which have been pruned
+
+		# the rows of the nodes along the path to the goal, from the one nearest the goal back to the first
+		# node's child, see RRT.find_goal_path
+		self.path = list(visited) if visited else []
+		self.on_path = np.zeros(n, dtype=bool)
+		self.on_path[self.path] = True
+		self.finish_time = finish_time # when the path gets to the goal, -1 if there isn't one
+
+		for array in (self.locations, self.arrivals, self.parent, self.valid, self.live, self.on_path):
+			array.flags.writeable = False
+
+	def __len__(self):
+		return len(self.arrivals)
+
+	def found(self):
+		return self.finish_time is not -1
+
+# steps the rrt forwards in time on its own thread, as Planner.step does, until the goal is found or
+# max_time is reached, publishing a Snapshot each step as self.snapshot
+# the goal can be moved while it runs with retarget, after which it carries on until it finds that
+# if planning raises, the thread stops and keeps the traceback as self.error, for whoever polls it
+# rrt.sim is replaced with a Scene, as nothing should be drawn from this thread
+class PlanningThread(threading.Thread):
+
+	pause = .001 # seconds to wait between steps, leaving the rest of the program time to run
+
+	def __init__(self, rrt, obstacles, time_step=RRT.time_step, max_time=None):
+		threading.Thread.__init__(self)
+		self.daemon = True
+
+		self.rrt = rrt
+		self.rrt.sim = Scene(obstacles)
+		self.time_step = time_step
+		self.max_time = max_time
+
+		self.steps = int(round(rrt.top_time / time_step))
+		self.t = self.steps * time_step
+		self.finish_time = -1
+		self.visited = None
+
+		self.requests = Queue.Queue() # goals to move to, and None to stop
+		self.snapshot = Snapshot(rrt, self.t)
+		self.error = None # the traceback of the exception which stopped the thread, if one did
+
+	# whether there is more to plan for the current goal
+	def growing(self):
+		return self.finish_time is -1 and (self.max_time is None or self.t < self.max_time)
+
+	def run(self):
+		try:
+			while True:
+				try:
+					goal = self.requests.get(block=not self.growing())
+				except Queue.Empty:
+					self.step()
+					time.sleep(PlanningThread.pause)
+					continue
+
+				if goal is None:
+					break
+				self.move_goal(goal)
+		except Exception:
+			self.error = traceback.format_exc()
+
+	def step(self):
+		self.steps += 1
+		# multiplying rather than adding keeps the times the same as the slider's
+		self.t = self.steps * self.time_step
+		visited = self.rrt.update(self.t)
+
+		if visited and self.finish_time is -1:
+			self.finish_time = self.rrt.store.arrival(visited[0])
+			self.visited = visited
+		self.publish()
+
+	def move_goal(self, goal):
+		self.finish_time = -1
+		self.visited = None
+		visited = self.rrt.retarget(goal, self.t)
+		if visited:
+			self.finish_time = self.rrt.store.arrival(visited[0])
+			self.visited = visited
+		self.publish()
+
+	def publish(self):
+		self.snapshot = Snapshot(self.rrt, self.t, self.visited, self.finish_time)
+
+	# moves the goal once the step being taken is done, see RRT.retarget
+	def retarget(self, goal):
+		self.requests.put(goal)
+
+	# stops the thread once the step being taken is done, waiting up to timeout seconds for it
+	def stop(self, timeout=None):
+		self.requests.put(None)
+		self.join(timeout)